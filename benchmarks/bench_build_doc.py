@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Compare parsing bytes natively with the old decode -> encode -> parse path.
+
+    python benchmarks/bench_build_doc.py [--size-mb 2] [--repeat 5]
+
+Peak memory is the Python heap peak reported by tracemalloc, it covers the
+temporary str/bytes copies but not libxml2's own tree.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from readability.htmls import parse_bytes, parse_transcoded
+
+
+def make_page(size, encoding):
+    paragraph = u'<p>Съешь же ещё этих мягких французских булок, да выпей чаю. %d</p>\n'
+    head = u'<html><head><meta charset="%s"><title>bench</title></head><body>' % encoding
+    parts = [head]
+    length, i = len(head), 0
+    while length < size:
+        part = paragraph % i
+        parts.append(part)
+        length += len(part.encode(encoding))
+        i += 1
+    parts.append(u'</body></html>')
+    return u''.join(parts).encode(encoding)
+
+
+def measure(func, page, encoding, repeat):
+    func(page, encoding)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(page, encoding)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    func(page, encoding)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=float, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    megabytes = size / (1024.0 * 1024.0)
+    print('%-12s %-12s %12s %14s' % ('encoding', 'path', 'ms per MB', 'peak heap MB'))
+    for encoding in ['utf-8', 'cp1251', 'koi8-r']:
+        page = make_page(size, encoding)
+        for name, func in [('transcoded', parse_transcoded), ('native', parse_bytes)]:
+            elapsed, peak = measure(func, page, encoding, args.repeat)
+            print('%-12s %-12s %12.2f %14.2f' % (
+                encoding, name, elapsed * 1000 / megabytes, peak / (1024.0 * 1024.0)))
+
+
+if __name__ == '__main__':
+    main()
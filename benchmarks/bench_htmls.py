@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""Time the tree helpers of readability.htmls against the cssselect
+queries they used to run.
+
+    python benchmarks/bench_htmls.py [--size-mb 2] [--repeat 5]
+
+Every cssselect() call translated its selector to XPath again and walked
+the whole tree, once per selector. The helpers now run one precompiled
+XPath each, or stop at the first matching element. Both
+versions are run on the same large pages and must give the same results.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lxml.html import document_fromstring
+
+from readability import htmls
+from bench_stages import WORDS, large_page, sentence
+
+
+def cssselect_shorten_title(doc):
+    title = doc.find('.//title')
+    orig = htmls.norm_title(title.text)
+    candidates = set()
+    for item in ['.//h1', './/h2', './/h3']:
+        for e in list(doc.iterfind(item)):
+            if e.text:
+                htmls.add_match(candidates, e.text, orig)
+            if e.text_content():
+                htmls.add_match(candidates, e.text_content(), orig)
+    for item in ['#title', '#head', '#heading', '.pageTitle', '.news_title', '.title',
+                 '.head', '.heading', '.contentheading', '.small_header_red']:
+        for e in doc.cssselect(item):
+            if e.text:
+                htmls.add_match(candidates, e.text, orig)
+            if e.text_content():
+                htmls.add_match(candidates, e.text_content(), orig)
+    return candidates
+
+
+def xpath_shorten_title(doc):
+    title = doc.find('.//title')
+    orig = htmls.norm_title(title.text)
+    candidates = set()
+    for e in htmls.title_candidates_xpath(doc):
+        if e.tag not in htmls.TITLE_TAGS and not htmls.matched_selectors(e, htmls.TITLE_SELECTORS):
+            continue
+        if e.text:
+            htmls.add_match(candidates, e.text, orig)
+        if e.text_content():
+            htmls.add_match(candidates, e.text_content(), orig)
+    return candidates
+
+
+def cssselect_image_in_bad_site(doc):
+    for item in ["#content", "#content-wrapper", "#wrapper", ".content", ".content-wrapper", ".wrapper"]:
+        wrapper = None
+        for elem in doc.cssselect(item):
+            if not htmls.test_upper_path(elem, htmls.BAD_IMAGE_BLOCK_PATTERN):
+                wrapper = elem
+                break
+        if wrapper is not None:
+            images = wrapper.cssselect("img")
+            if images:
+                if htmls.BAD_IMAGE_PATTERN.search(images[0].get("src", "")):
+                    continue
+                return images[0].get("src")
+    return None
+
+
+def cssselect_first_image_url(doc):
+    images = doc.cssselect('img')
+    return images[0].get("src") if images else None
+
+
+def cssselect_lead(doc):
+    paragraphs = doc.cssselect("p")
+    return paragraphs[0].text_content() if paragraphs else None
+
+
+def xpath_lead(doc):
+    paragraph = next(doc.iter('p'), None)
+    return paragraph.text_content() if paragraph is not None else None
+
+
+HELPERS = [
+    ('shorten_title', cssselect_shorten_title, xpath_shorten_title),
+    ('image_in_bad_site', cssselect_image_in_bad_site, htmls.get_image_in_bad_site),
+    ('first_image_url', cssselect_first_image_url, htmls.get_first_image_url),
+    ('lead', cssselect_lead, xpath_lead),
+]
+
+
+def wrapped_page(rng, size):
+    """A page whose image is in a .wrapper, after comments holding the
+    other wrappers, so that the image helper looks at every selector."""
+    parts = ['<div id="comments">']
+    for i in range(50):
+        parts.append('<div class="comment content"><img src="/c/%d.png"><p>%s</p></div>' % (
+            i, sentence(rng, 8)))
+    parts.append('</div><h1 class="title">Wrapped page title with enough words</h1>')
+    length = 0
+    while length < size:
+        part = '<div class="text"><h3>%s</h3><p>%s</p></div>' % (sentence(rng, 4), sentence(rng))
+        parts.append(part)
+        length += len(part)
+    parts.append('<div class="wrapper"><img src="/avatar.png"></div>')
+    parts.append('<div class="wrapper x"><p>%s</p><img src="/main.jpg"></div>' % rng.choice(WORDS))
+    return ('<html><head><title>Wrapped page title with enough words | Site</title></head>'
+            '<body>%s</body></html>' % ''.join(parts)).encode('utf-8')
+
+
+def best_time(func, doc, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(doc)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=float, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    rng = random.Random(42)
+    pages = [('large', large_page(rng, size)), ('wrapped', wrapped_page(rng, size))]
+    print('%-10s %-18s %14s %14s %8s' % ('page', 'helper', 'cssselect ms', 'xpath ms', 'speedup'))
+    for name, html in pages:
+        doc = document_fromstring(html)
+        for helper, old, new in HELPERS:
+            if old(doc) != new(doc):
+                sys.exit('%s gives another result on the %s page' % (helper, name))
+            old_time = best_time(old, doc, args.repeat)
+            new_time = best_time(new, doc, args.repeat)
+            print('%-10s %-18s %14.2f %14.2f %7.1fx' % (
+                name, helper, old_time * 1000, new_time * 1000, old_time / max(new_time, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""Check that Document.parse() stays linear in the nesting depth.
+
+    python benchmarks/bench_nesting.py [--depths 25,50,100,200] [--repeat 3]
+
+The pages nest their content one div per level, so a page D levels deep
+is D times larger too. Serializing the children of every div to find
+misused ones made an 8x deeper page take some 50x longer. The run fails
+(exit status 1) when the time per level of the deepest page is more than
+--limit times that of the shallowest one.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from readability import Document
+
+
+def nested_divs(depth, width=20):
+    leaf = "<div>some words, and more words <b>bold</b> here</div>" * width
+    return "<html><body>" + ("<div>" + leaf) * depth + "</div>" * depth + "</body></html>"
+
+
+def best_time(html, repeat):
+    best = None
+    for _ in range(repeat):
+        doc = Document(html)
+        start = time.perf_counter()
+        doc.parse(["summary"])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depths', default='25,50,100,200')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=float, default=3.0,
+                        help='largest allowed ratio of the times per level')
+    args = parser.parse_args()
+
+    depths = [int(depth) for depth in args.depths.split(',')]
+    print('%8s %10s %14s' % ('depth', 'ms', 'ms per level'))
+    per_level = []
+    for depth in depths:
+        elapsed = best_time(nested_divs(depth), args.repeat)
+        per_level.append(elapsed / depth)
+        print('%8d %10.2f %14.3f' % (depth, elapsed * 1000, elapsed * 1000 / depth))
+    ratio = per_level[-1] / per_level[0]
+    print('time per level grew %.1fx' % ratio)
+    if ratio > args.limit:
+        sys.exit('parse time grows faster than the depth')
+
+
+if __name__ == '__main__':
+    main()
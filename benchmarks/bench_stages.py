@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+"""Throughput, latency and per-stage timings of Document.parse().
+
+    python benchmarks/bench_stages.py [--repeat 3] [--fields title,summary]
+    python benchmarks/bench_stages.py --save-baseline baseline.json
+    python benchmarks/bench_stages.py --baseline baseline.json [--threshold 0.25]
+
+Pages come from the committed corpus (tests/samples and benchmarks/corpus,
+plus --corpus directories) and from synthetic generators for large, deeply
+nested and table heavy pages. Every set is parsed --repeat times, stage
+timings and throughput are taken from the fastest round.
+
+Stage times exclude the stages nested in them: build_doc does not include
+get_encoding and sanitize does not include strip_attributes. "other" is
+the rest of parse(), unlikely candidate removal, div transformation, the
+text metrics index, candidate selection and serialization among them. With
+--baseline the run fails (exit status 1) when a stage of a set got slower
+than the baseline by more than --threshold and by more than --floor ms.
+Compare runs made on the same, otherwise idle, machine: timings on a
+busy or shared one easily vary by more than the default threshold.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from readability import htmls
+from readability import readability
+from readability.readability import Document
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+CORPUS_DIRS = [
+    os.path.join(ROOT, 'tests', 'samples'),
+    os.path.join(ROOT, 'benchmarks', 'corpus'),
+]
+STAGES = [
+    'get_encoding', 'build_doc', 'cleaner', 'score_paragraphs',
+    'sanitize', 'strip_attributes', 'other',
+]
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do "
+         "eiusmod tempor incididunt ut labore et dolore magna aliqua").split()
+
+
+def sentence(rng, words=20):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + ', ' + \
+        ' '.join(rng.choice(WORDS) for _ in range(words // 2)) + '.'
+
+
+def page(title, body):
+    return ('<html><head><meta charset="utf-8"><title>%s</title></head>'
+            '<body>%s</body></html>' % (title, body)).encode('utf-8')
+
+
+def large_page(rng, size=2 * 1024 * 1024):
+    """A long article between a navigation menu, a sidebar and comments."""
+    nav = '<ul id="nav">%s</ul>' % ''.join(
+        '<li><a href="/section/%d">Section %d</a></li>' % (i, i) for i in range(40))
+    sidebar = '<div class="sidebar">%s</div>' % ''.join(
+        '<div class="widget"><a href="/post/%d">%s</a></div>' % (i, sentence(rng, 6))
+        for i in range(50))
+    parts = []
+    length = 0
+    while length < size:
+        part = '<p style="margin: 0" class="text">%s <a href="/more">%s</a> %s</p>\n' % (
+            sentence(rng), rng.choice(WORDS), sentence(rng))
+        if rng.random() < 0.1:
+            part += '<h2 class="subtitle">%s</h2><img src="/img/%d.jpg" width="10" height="10">' % (
+                sentence(rng, 4), len(parts))
+        parts.append(part)
+        length += len(part)
+    comments = '<div id="comments">%s</div>' % ''.join(
+        '<div class="comment"><p>%s</p></div>' % sentence(rng, 8) for _ in range(200))
+    return page('Large page', nav + sidebar + '<div class="article">%s</div>' % ''.join(parts) + comments)
+
+
+def deep_page(rng, depth=200, width=30):
+    """Content wrapped in hundreds of nested divs, as page builders do."""
+    parts = []
+    for i in range(width):
+        inner = '<p>%s</p><p>%s</p>' % (sentence(rng), sentence(rng))
+        for level in range(depth):
+            inner = '<div class="wrap-%d">%s</div>' % (level % 7, inner)
+        parts.append(inner)
+    return page('Deep page', ''.join(parts))
+
+
+def table_page(rng, rows=400, columns=8):
+    """A table layout page with a large data table inside."""
+    cells = ''.join(
+        '<tr>%s</tr>' % ''.join(
+            '<td bgcolor="#eee">%s</td>' % (sentence(rng, 3) if c else '<a href="/r/%d">%d</a>' % (r, r))
+            for c in range(columns))
+        for r in range(rows))
+    layout = ('<table width="100%%"><tr><td class="menu">%s</td><td class="main">'
+              '<p>%s</p><table class="data">%s</table><p>%s</p></td></tr></table>') % (
+        ''.join('<a href="/m/%d">Menu %d</a><br>' % (i, i) for i in range(30)),
+        sentence(rng, 40), cells, sentence(rng, 40))
+    return page('Table page', layout)
+
+
+def load_corpus(dirs):
+    pages = []
+    for directory in dirs:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    pages.append(f.read())
+    return pages
+
+
+def page_sets(args):
+    rng = random.Random(42)
+    return [
+        ('corpus', load_corpus(CORPUS_DIRS + args.corpus)),
+        ('large', [large_page(rng)]),
+        ('deep', [deep_page(rng)]),
+        ('tables', [table_page(rng) for _ in range(3)]),
+    ]
+
+
+class StageTimer:
+    """Self time of wrapped functions, nested stages are subtracted from
+    the stage calling them."""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(STAGES, 0.0)
+        self.__stack = []
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            self.__stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self.__stack.pop()
+                self.totals[stage] += elapsed - nested
+                if self.__stack:
+                    self.__stack[-1] += elapsed
+        return timed
+
+    def reset(self):
+        self.totals = dict.fromkeys(STAGES, 0.0)
+
+
+@contextmanager
+def patched(timer):
+    targets = [
+        (readability, 'page_encoding', 'get_encoding'),
+        (readability, 'parse_page', 'build_doc'),
+        (readability, 'html_cleaner', 'cleaner'),
+        (Document, '_Document__score_paragraphs', 'score_paragraphs'),
+        (Document, '_Document__sanitize', 'sanitize'),
+        (readability, 'strip_attributes', 'strip_attributes'),
+        (htmls, 'strip_attributes', 'strip_attributes'),
+    ]
+    saved = [(owner, name, getattr(owner, name)) for owner, name, stage in targets]
+    for owner, name, stage in targets:
+        setattr(owner, name, timer.wrap(stage, getattr(owner, name)))
+    try:
+        yield
+    finally:
+        for owner, name, func in saved:
+            setattr(owner, name, func)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run_set(pages, fields, repeat):
+    timer = StageTimer()
+    latencies = []
+    best = None
+    with patched(timer):
+        for _ in range(repeat):
+            gc.collect()
+            timer.reset()
+            started = time.perf_counter()
+            for html in pages:
+                start = time.perf_counter()
+                try:
+                    doc = Document(html)
+                    doc.parse(fields)
+                except readability.Unparseable:
+                    pass
+                latencies.append(time.perf_counter() - start)
+            total = time.perf_counter() - started
+            if best is None or total < best[0]:
+                best = (total, dict(timer.totals))
+
+    total, stages = best
+    stages['other'] = max(total - sum(stages.values()), 0.0)
+    size = sum(len(html) for html in pages)
+    return {
+        'docs': len(pages),
+        'megabytes': size / (1024.0 * 1024.0),
+        'docs_per_sec': len(pages) / total,
+        'mb_per_sec': size / (1024.0 * 1024.0) / total,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'stages_ms': dict((stage, stages[stage] * 1000 / len(pages)) for stage in STAGES),
+    }
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rss / 1024.0
+
+
+def report(results):
+    print('%-8s %5s %8s %9s %8s %9s %9s' % (
+        'set', 'docs', 'MB', 'docs/s', 'MB/s', 'p50 ms', 'p99 ms'))
+    for name, result in results.items():
+        print('%-8s %5d %8.2f %9.1f %8.2f %9.2f %9.2f' % (
+            name, result['docs'], result['megabytes'], result['docs_per_sec'],
+            result['mb_per_sec'], result['p50_ms'], result['p99_ms']))
+    print('')
+    print(('%-8s' + ' %16s' * len(STAGES)) % (('ms/doc',) + tuple(STAGES)))
+    for name, result in results.items():
+        print(('%-8s' + ' %16.2f' * len(STAGES)) % (
+            (name,) + tuple(result['stages_ms'][stage] for stage in STAGES)))
+
+
+def compare(results, baseline, threshold, floor):
+    """Return the (set, stage, baseline ms, current ms) that regressed."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline['sets']:
+            continue
+        before = baseline['sets'][name]['stages_ms']
+        for stage, current in result['stages_ms'].items():
+            previous = before.get(stage)
+            if previous is None:
+                continue
+            if current > previous * (1 + threshold) and current - previous > floor:
+                regressions.append((name, stage, previous, current))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fields', default='title,summary',
+                        help='comma separated parse() fields')
+    parser.add_argument('--corpus', action='append', default=[],
+                        help='another directory of pages to add to the corpus set')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--baseline', metavar='PATH')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown of a stage as a fraction (default: 0.25)')
+    parser.add_argument('--floor', type=float, default=0.5,
+                        help='slowdowns under this many ms per doc are ignored (default: 0.5)')
+    args = parser.parse_args()
+
+    fields = [field for field in args.fields.split(',') if field]
+    results = {}
+    for name, pages in page_sets(args):
+        if pages:
+            results[name] = run_set(pages, fields, args.repeat)
+    report(results)
+    rss = peak_rss_mb()
+    print('\npeak RSS: %.1f MB' % rss)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'fields': fields, 'peak_rss_mb': rss, 'sets': results}, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.floor)
+        for name, stage, previous, current in regressions:
+            print('REGRESSION %s/%s: %.2f -> %.2f ms/doc' % (name, stage, previous, current))
+        if regressions:
+            sys.exit(1)
+        print('no stage slower than the baseline by more than %d%%' % (args.threshold * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,2 @@
 from .readability import Document
+from .readability import Extractor
@@ -0,0 +1,153 @@
+"""Extract articles from the command line.
+
+    python -m readability -f title,summary -j 8 pages/ > results.jsonl
+    zcat archive.jsonl.gz | python -m readability -f title,lead > results.jsonl
+
+Files and directories given as arguments are read as html pages. Without
+them, stdin is read as JSONL, one ``{"url": ..., "html": ...}`` record per
+line. Every page gives one JSON line on stdout holding its "path" or "url"
+and the requested fields, or an "error".
+"""
+import argparse
+import json
+import os
+import sys
+
+from .batch import FIELDS
+from .batch import extract_many
+from .cache import ResultCache
+
+
+def iter_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def read_files(paths, base_url):
+    for path in iter_paths(paths):
+        try:
+            with open(path, 'rb') as f:
+                html = f.read()
+        except OSError as e:
+            sys.stderr.write("%s: %s\n" % (path, e))
+            continue
+        yield {"path": path}, (html, base_url)
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            html = record["html"]
+        except (ValueError, TypeError, KeyError) as e:
+            sys.stderr.write("stdin line %d skipped: %s\n" % (number, e))
+            continue
+        yield {"url": record.get("url")}, (html, record.get("url"))
+
+
+def parse_fields(value):
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    for field in fields:
+        if field not in FIELDS:
+            raise argparse.ArgumentTypeError(
+                "unknown field %r, choose from %s" % (field, ", ".join(FIELDS)))
+    return fields
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m readability",
+        description="Extract readable content from html pages as JSON lines.")
+    parser.add_argument('paths', nargs='*',
+                        help='html files or directories, JSONL records are read from stdin without them')
+    parser.add_argument('-f', '--fields', type=parse_fields, default=["title", "summary"],
+                        help='comma separated parse() fields (default: title,summary)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='worker processes, 0 for one per CPU (default: 1)')
+    parser.add_argument('--chunksize', type=int, default=8,
+                        help='pages sent to a worker at once (default: 8)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='write results as they complete instead of in input order')
+    parser.add_argument('--base-url', help='base url of the html files, to make links absolute')
+    parser.add_argument('--partial', action='store_true',
+                        help='leave the html/body tags out of summary')
+    parser.add_argument('--format', choices=['html', 'text', 'markdown', 'blocks'], default='html',
+                        help='format of the summary (default: html)')
+    parser.add_argument('--min-text-length', type=int, default=25)
+    parser.add_argument('--retry-length', type=int, default=250)
+    parser.add_argument('--max-bytes', type=int, help='only parse this many bytes of a page')
+    parser.add_argument('--max-nodes', type=int, help='drop the elements of a page after this many')
+    parser.add_argument('--max-depth', type=int,
+                        help='replace the elements nested deeper than this by their text')
+    parser.add_argument('--deadline', type=float,
+                        help='seconds after which the summary of a page is returned as it is')
+    parser.add_argument('--cache', metavar='PATH',
+                        help='sqlite file of results, pages already in it are not extracted again')
+    parser.add_argument('--cache-age', type=float,
+                        help='seconds results of the cache are used for')
+    return parser
+
+
+def run(args, stdin, stdout):
+    if args.paths:
+        records = read_files(args.paths, args.base_url)
+    else:
+        records = read_jsonl(stdin)
+
+    # Only the pages in flight are kept here, extract_many reads `records`
+    # lazily.
+    pending = {}
+
+    def documents():
+        for index, (record, document) in enumerate(records):
+            pending[index] = record
+            yield document
+
+    cache = None
+    if args.cache:
+        cache = ResultCache(args.cache, max_age=args.cache_age)
+    results = extract_many(
+        documents(), args.fields, cache=cache,
+        workers=args.jobs or None, chunksize=args.chunksize,
+        ordered=not args.unordered, html_partial=args.partial, output_format=args.format,
+        min_text_length=args.min_text_length, retry_length=args.retry_length,
+        max_bytes=args.max_bytes, max_nodes=args.max_nodes, max_depth=args.max_depth,
+        deadline=args.deadline)
+    try:
+        for result in results:
+            record = pending.pop(result.index)
+            if result.error:
+                record["error"] = result.error
+            else:
+                record.update(result.fields)
+            stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        run(args, sys.stdin.buffer, sys.stdout)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away (`| head`), stop quietly.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
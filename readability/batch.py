@@ -0,0 +1,221 @@
+"""Extract many documents in parallel on a process pool.
+
+    from readability.batch import extract_many
+
+    for result in extract_many(pages, fields=["title", "summary"], workers=32):
+        if result.error:
+            ...
+        else:
+            store(result.index, result.fields["summary"])
+"""
+import multiprocessing
+import os
+import queue
+from collections import deque
+from collections import namedtuple
+
+from .readability import Document
+from .readability import FIELDS
+
+# `fields` maps field names to values, `error` is set instead when the
+# document could not be extracted. `degraded` lists the limits the
+# extraction ran into, see Document.degraded().
+BatchResult = namedtuple('BatchResult', ['index', 'fields', 'error', 'degraded'], defaults=[()])
+
+
+def extract(html, fields, html_partial=False, base_url=None, output_format="html", **document_options):
+    """Parse one document and return a dict of the requested fields."""
+    return extract_document(
+        html, fields, html_partial, output_format, base_url=base_url, **document_options)[0]
+
+
+def extract_document(html, fields, html_partial=False, output_format="html", **document_options):
+    """Like extract(), also returning the limits the parse ran into."""
+    doc = Document(html, **document_options)
+    doc.parse(list(fields), html_partial=html_partial, output_format=output_format)
+    return dict((field, getattr(doc, field)()) for field in fields), tuple(doc.degraded())
+
+
+def split_item(item):
+    if isinstance(item, tuple):
+        return item
+    return item, None
+
+
+def extract_chunk(chunk, fields, parse_options, document_options):
+    results = []
+    for index, item in chunk:
+        html, base_url = split_item(item)
+        try:
+            values, degraded = extract_document(
+                html, fields, base_url=base_url, **parse_options, **document_options)
+        except Exception as e:
+            results.append(BatchResult(index, None, "%s: %s" % (type(e).__name__, e)))
+        else:
+            results.append(BatchResult(index, values, None, degraded))
+    return results
+
+
+def lookup_chunk(cache, chunk, fields, parse_options, document_options, keys):
+    """Return the results of `chunk` found in `cache` and the rest of the
+    chunk, to extract. The keys of the latter are added to `keys`."""
+    if cache is None:
+        return [], chunk
+    hits = []
+    missing = []
+    for index, item in chunk:
+        html, base_url = split_item(item)
+        key = cache.key(html, fields, base_url=base_url, **parse_options, **document_options)
+        values = cache.get(key)
+        if values is None:
+            missing.append((index, item))
+            keys[index] = key
+        else:
+            hits.append(BatchResult(index, values, None))
+    return hits, missing
+
+
+def store_results(cache, results, keys):
+    """Put extracted results in `cache`, but those cut short by the
+    deadline, which could complete next time, and the failed ones."""
+    if cache is None:
+        return results
+    for result in results:
+        key = keys.pop(result.index, None)
+        if key is not None and result.error is None and 'deadline' not in result.degraded:
+            cache.put(key, result.fields)
+    return results
+
+
+def chunked(documents, chunksize):
+    chunk = []
+    for item in enumerate(documents):
+        chunk.append(item)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def failed_chunk(chunk, error):
+    message = "%s: %s" % (type(error).__name__, error)
+    return [BatchResult(index, None, message) for index, item in chunk]
+
+
+def extract_many(
+        documents,
+        fields=("title", "summary"),
+        workers=None, chunksize=8, ordered=True,
+        max_tasks_per_worker=None, html_partial=False, output_format="html", cache=None,
+        **document_options):
+    """Extract `fields` from every document of an iterable.
+
+    Yields a BatchResult per document. Exceptions raised for a document,
+    Unparseable included, end up in its `error` instead of stopping the
+    batch.
+
+    :param documents: iterable of html strings/bytes, or of (html, base_url)
+        tuples. It is consumed lazily, only a few chunks per worker are in
+        flight at any time.
+    :param fields: parse() fields to return
+    :param workers: number of worker processes, defaults to the number of
+        CPUs. With 1 the documents are extracted in this process.
+    :param chunksize: number of documents sent to a worker at once
+    :param ordered: yield results in input order, otherwise as they complete
+    :param max_tasks_per_worker: replace a worker after it handled that many
+        chunks, to give back memory held by lxml
+    :param output_format: format of the summary, see Document.parse().
+        "element" only works in this process, without a cache.
+    :param cache: a readability.cache.ResultCache, documents found in it
+        are not extracted again and extracted ones are added to it
+    :param document_options: other Document() arguments
+    """
+    fields = list(fields)
+    for field in fields:
+        if field not in FIELDS:
+            raise ValueError("unknown field %r" % field)
+
+    workers = workers or os.cpu_count() or 1
+    if output_format == "element" and (workers != 1 or cache is not None):
+        raise ValueError("elements can only be returned by workers=1 without a cache")
+    parse_options = {'html_partial': html_partial, 'output_format': output_format}
+    chunks = chunked(documents, chunksize)
+    if workers == 1:
+        keys = {}
+        for chunk in chunks:
+            hits, missing = lookup_chunk(cache, chunk, fields, parse_options, document_options, keys)
+            results = extract_chunk(missing, fields, parse_options, document_options)
+            store_results(cache, results, keys)
+            for result in sorted(hits + results, key=lambda result: result.index):
+                yield result
+        return
+
+    pool = multiprocessing.Pool(workers, maxtasksperchild=max_tasks_per_worker)
+    try:
+        if ordered:
+            results = ordered_results(pool, chunks, workers * 2, fields, parse_options, document_options, cache)
+        else:
+            results = completed_results(pool, chunks, workers * 2, fields, parse_options, document_options, cache)
+        for result in results:
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def ordered_results(pool, chunks, window, fields, parse_options, document_options, cache):
+    pending = deque()
+    keys = {}
+    for chunk in chunks:
+        hits, missing = lookup_chunk(cache, chunk, fields, parse_options, document_options, keys)
+        async_result = None
+        if missing:
+            async_result = pool.apply_async(
+                extract_chunk, (missing, fields, parse_options, document_options))
+        pending.append((hits, missing, async_result))
+        if len(pending) >= window:
+            for result in chunk_results(cache, keys, *pending.popleft()):
+                yield result
+    while pending:
+        for result in chunk_results(cache, keys, *pending.popleft()):
+            yield result
+
+
+def chunk_results(cache, keys, hits, chunk, async_result):
+    if async_result is None:
+        return hits
+    try:
+        results = store_results(cache, async_result.get(), keys)
+    except Exception as e:
+        for index, item in chunk:
+            keys.pop(index, None)
+        results = failed_chunk(chunk, e)
+    return sorted(hits + results, key=lambda result: result.index)
+
+
+def completed_results(pool, chunks, window, fields, parse_options, document_options, cache):
+    done = queue.Queue()
+    pending = 0
+    keys = {}
+
+    for chunk in chunks:
+        hits, missing = lookup_chunk(cache, chunk, fields, parse_options, document_options, keys)
+        for result in hits:
+            yield result
+        if not missing:
+            continue
+        pool.apply_async(
+            extract_chunk, (missing, fields, parse_options, document_options),
+            callback=done.put,
+            error_callback=lambda e, chunk=missing: done.put(failed_chunk(chunk, e)))
+        pending += 1
+        if pending >= window:
+            for result in store_results(cache, done.get(), keys):
+                yield result
+            pending -= 1
+    while pending:
+        for result in store_results(cache, done.get(), keys):
+            yield result
+        pending -= 1
+
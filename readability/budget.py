@@ -0,0 +1,51 @@
+"""Limits on the size of the pages Document works on.
+
+Pages over a limit are cut down before the extraction starts, see the
+max_bytes, max_nodes and max_depth arguments of Document.
+"""
+from lxml.etree import Element
+from lxml.etree import strip_tags
+from lxml.html.defs import block_tags
+
+
+def truncate_nodes(doc, max_nodes):
+    """Drop everything after the first `max_nodes` elements of `doc`, in
+    document order. Returns True if something was dropped."""
+    for count, elem in enumerate(doc.iter(Element)):
+        if count == max_nodes:
+            break
+    else:
+        return False
+
+    # `elem` goes with what follows it: its following siblings, then those
+    # of each of its ancestors, and their tails.
+    node = elem
+    parent = node.getparent()
+    while parent is not None:
+        for sibling in list(node.itersiblings()):
+            parent.remove(sibling)
+        if node is elem:
+            parent.remove(elem)
+        else:
+            node.tail = None
+        node = parent
+        parent = node.getparent()
+    return True
+
+
+def flatten_depth(doc, max_depth):
+    """Replace the elements nested deeper than `max_depth` levels, <html>
+    being the first one, by their text. A newline is put around the text
+    of block elements so their words stay apart. Returns True if something
+    was flattened."""
+    flattened = False
+    for elem in doc.xpath('/*' * max_depth):
+        if not len(elem):
+            continue
+        for child in elem.iterdescendants():
+            if child.tag in block_tags:
+                child.text = '\n' + (child.text or '')
+                child.tail = '\n' + (child.tail or '')
+        strip_tags(elem, '*')
+        flattened = True
+    return flattened
@@ -0,0 +1,292 @@
+"""Parse a page while it arrives, in chunks.
+
+    builder = DocumentBuilder(base_url=url, content_encoding="gzip")
+    for chunk in response:
+        if builder.feed(chunk):
+            break
+    doc = builder.close()
+    doc.parse(["title", "summary"])
+
+The chunks go to lxml's feed parser as they come, so parsing overlaps
+with reading the page. Only the first VALIDATE_BYTES bytes are held back,
+to detect the encoding, the rest of the body is not kept.
+"""
+import codecs
+import re
+import zlib
+from urllib.parse import urlparse
+
+import lxml.etree
+
+from .encoding import VALIDATE_BYTES
+from .htmls import LXML_ENCODINGS
+from .htmls import new_parser
+from .htmls import page_encoding
+from .readability import Document
+
+READ_SIZE = 64 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+body_end_re = re.compile(b'</body\\s*>', re.I)
+# Bytes kept from a chunk to find a </body> tag split over two chunks.
+BODY_END_OVERLAP = 64
+
+
+def decompressor(content_encoding):
+    """Return a decompressobj-like decoder for a Content-Encoding, None
+    for identity. Raises ValueError for other encodings."""
+    content_encoding = (content_encoding or '').strip().lower()
+    if content_encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if content_encoding == 'deflate':
+        return DeflateDecoder()
+    if content_encoding in ('', 'identity'):
+        return None
+    raise ValueError("unsupported content encoding %r" % content_encoding)
+
+
+class DeflateDecoder:
+    """Decoder for "deflate" bodies, which servers send with or without
+    the zlib header. The first two bytes are held back to look for the
+    header. Corrupt data raises zlib.error, as with gzip."""
+
+    def __init__(self):
+        self.__decoder = None
+        self.__first = b''
+
+    def decompress(self, data):
+        if self.__decoder is not None:
+            return self.__decoder.decompress(data)
+        self.__first += data
+        if len(self.__first) < 2:
+            return b''
+        data, self.__first = self.__first, b''
+        if has_zlib_header(data):
+            self.__decoder = zlib.decompressobj()
+            try:
+                return self.__decoder.decompress(data)
+            except zlib.error:
+                # Raw deflate data can start like a zlib header.
+                pass
+        self.__decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self.__decoder.decompress(data)
+
+    def flush(self):
+        if self.__decoder is None:
+            self.__decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self.__decoder.decompress(self.__first) + self.__decoder.flush()
+        return self.__decoder.flush()
+
+
+def has_zlib_header(data):
+    """True if `data` starts with a zlib header (RFC 1950): deflate method,
+    a window of at most 32K and a valid check value."""
+    return data[0] & 0x0f == 8 and data[0] >> 4 <= 7 and (data[0] << 8 | data[1]) % 31 == 0
+
+
+def repair_codec(encoding):
+    """Return a strict incremental decoder checking bytes in `encoding`,
+    or None when they cannot be repaired while they are parsed: Python
+    does not know the encoding or it does not write ASCII as itself."""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)('strict')
+        ascii_compatible = codecs.encode('<', LXML_ENCODINGS.get(encoding, encoding)) == b'<'
+    except LookupError:
+        return None
+    return decoder if ascii_compatible else None
+
+
+class DocumentBuilder:
+    """Build a Document from a page fed in chunks.
+
+    The first VALIDATE_BYTES bytes of a bytes page are held back to detect
+    its encoding exactly as Document does, the rest is parsed as it comes.
+    The chunks are checked against the encoding as they are fed, none is
+    kept: from the first bytes invalid in it, the page is decoded in Python
+    with replacement characters and written back in the encoding for
+    libxml2, as Document parses such pages from Python decoded text. str
+    chunks are parsed as text.
+
+    :param content_encoding: "gzip", "deflate" or "identity", as in the
+        Content-Encoding header. With None, gzip data is recognized by its
+        magic bytes and anything else is taken as is.
+    :param stop_at_body_end: ignore what comes after the first </body>
+        tag, feed() returns True once it is seen so the caller can stop
+        reading. libxml2 moves content found after </body> into the body,
+        so pages having some may be extracted differently.
+
+    Other keyword arguments are Document arguments. With max_bytes, feed()
+    returns True too once that many bytes (after decompression) came.
+    """
+
+    def __init__(self, content_encoding=None, stop_at_body_end=False, **document_options):
+        self.document_options = document_options
+        self.stop_at_body_end = stop_at_body_end
+        self.done = False
+        self.encoding = None
+        self.encoding_source = None
+        self.__sniff = content_encoding is None
+        self.__decoder = None if self.__sniff else decompressor(content_encoding)
+        self.__text = None
+        self.__raw = b''
+        self.__head = []
+        self.__head_size = 0
+        self.__validator = None
+        self.__pending = b''
+        self.__tail = b''
+        self.__size = 0
+        self.__truncated = False
+        self.__parser = None
+        self.__transcoder = None
+        self.__target = ('utf-8', 'replace')
+        self.__closed = False
+
+    def feed(self, chunk):
+        """Parse the next chunk of the page. Returns True once the end of
+        the body was seen with `stop_at_body_end`, later chunks are then
+        ignored."""
+        if self.__closed:
+            raise ValueError("feed() after close()")
+        if self.done or not chunk:
+            return self.done
+        if isinstance(chunk, str):
+            if self.__text is False:
+                raise TypeError("str chunk in a bytes page")
+            self.__text = True
+            self.__accept(chunk.encode('utf-8', 'replace'))
+            return self.done
+        if self.__text:
+            raise TypeError("bytes chunk in a str page")
+        self.__text = False
+        if self.__sniff:
+            # Wait for the gzip magic bytes to be complete.
+            self.__raw += chunk
+            if len(self.__raw) < len(GZIP_MAGIC):
+                return self.done
+            self.__sniff = False
+            if self.__raw.startswith(GZIP_MAGIC):
+                self.__decoder = decompressor('gzip')
+            chunk, self.__raw = self.__raw, b''
+        if self.__decoder is not None:
+            chunk = self.__decoder.decompress(chunk)
+        self.__accept(chunk)
+        return self.done
+
+    def close(self):
+        """Finish parsing and return the Document of the page."""
+        if self.__closed:
+            raise ValueError("close() called twice")
+        if self.__raw and not self.done:
+            self.__accept(self.__raw)
+        if self.__decoder is not None and not self.done:
+            self.__accept(self.__decoder.flush())
+        self.__closed = True
+        if self.__parser is None:
+            if not self.__head:
+                raise lxml.etree.ParserError("Document is empty")
+            self.__start()
+        if self.__validator is not None:
+            self.__parser.feed(self.__validate(b'', True))
+        if self.__transcoder is not None:
+            self.__parser.feed(self.__transcode(b'', True))
+
+        doc = self.__parser.close()
+        if doc is None:
+            raise lxml.etree.ParserError("Document is empty")
+        return Document.from_tree(
+            doc, self.encoding, self.encoding_source, self.__truncated,
+            **self.document_options)
+
+    def __accept(self, data):
+        if not data:
+            return
+        if self.stop_at_body_end:
+            window = self.__tail + data
+            match = body_end_re.search(window)
+            if match is not None:
+                data = data[:match.end() - len(self.__tail)]
+                self.done = True
+            else:
+                self.__tail = window[-BODY_END_OVERLAP:]
+        max_bytes = self.document_options.get('max_bytes')
+        if max_bytes is not None and self.__size + len(data) > max_bytes:
+            data = data[:max_bytes - self.__size]
+            self.__truncated = self.done = True
+        self.__size += len(data)
+        if self.__parser is not None:
+            self.__feed(data)
+            return
+        self.__head.append(data)
+        self.__head_size += len(data)
+        if self.__text or self.__head_size > VALIDATE_BYTES:
+            self.__start()
+
+    def __start(self):
+        """Detect the encoding from the held back chunks and parse them."""
+        head = b''.join(self.__head)
+        self.__head = None
+        if self.__text:
+            self.__parser = new_parser('utf-8')
+        else:
+            base_url = self.document_options.get('base_url')
+            host = urlparse(base_url).hostname if base_url else None
+            self.encoding, self.encoding_source = page_encoding(
+                head, self.document_options.get('http_charset'), host)
+            self.__parser = new_parser(self.encoding)
+            if self.__parser is None:
+                self.__parser = new_parser('utf-8')
+                self.__transcoder = incremental_decoder(self.encoding)
+            else:
+                self.__validator = repair_codec(self.encoding)
+        self.__feed(head)
+
+    def __feed(self, data):
+        if self.__validator is not None:
+            data = self.__validate(data)
+        elif self.__transcoder is not None:
+            data = self.__transcode(data)
+        self.__parser.feed(data)
+
+    def __validate(self, data, final=False):
+        """Return the bytes of `data` which are complete characters of the
+        encoding, and switch to transcoding at the first invalid ones."""
+        try:
+            self.__validator.decode(data, final)
+        except UnicodeDecodeError:
+            data, self.__pending = self.__pending + data, b''
+            self.__validator = None
+            self.__transcoder = incremental_decoder(self.encoding)
+            self.__target = (LXML_ENCODINGS.get(self.encoding, self.encoding), 'xmlcharrefreplace')
+            return self.__transcode(data, final)
+        # Bytes of a character split over two chunks wait for the next one.
+        data = self.__pending + data
+        pending = self.__validator.getstate()[0]
+        self.__pending = pending
+        return data[:len(data) - len(pending)]
+
+    def __transcode(self, data, final=False):
+        return self.__transcoder.decode(data, final).encode(*self.__target)
+
+
+def incremental_decoder(encoding):
+    try:
+        return codecs.getincrementaldecoder(encoding)('replace')
+    except LookupError:
+        # As parse_transcoded(), for encodings neither libxml2 nor Python know.
+        return codecs.getincrementaldecoder('utf-8')('replace')
+
+
+def build_document(source, read_size=READ_SIZE, **options):
+    """Build a Document from a file object (read `read_size` at a time)
+    or an iterable of chunks. Keyword arguments are DocumentBuilder and
+    Document arguments."""
+    builder = DocumentBuilder(**options)
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(read_size)
+            if not chunk or builder.feed(chunk):
+                break
+    else:
+        for chunk in source:
+            if builder.feed(chunk):
+                break
+    return builder.close()
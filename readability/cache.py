@@ -0,0 +1,228 @@
+"""Cache of extraction results, keyed by the page and the options.
+
+    cache = ResultCache("results.db", max_age=24 * 3600)
+    fields = cache.extract(html, ["title", "summary"], base_url=url)
+
+Re-crawled pages which did not change are not parsed again. Results are
+kept in memory (LRU) and, with a path, in a sqlite file shared by the
+processes and the runs using it.
+"""
+import hashlib
+import inspect
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from .batch import extract_document
+from .lru import LRUCache
+from .readability import Document
+
+try:
+    from importlib.metadata import version as package_version
+    VERSION = package_version('readability-lxml')
+except Exception:
+    VERSION = 'dev'
+
+# Part of every key: results of another version of the extraction, or of
+# another key layout, are not used.
+KEY_VERSION = '1:' + VERSION
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    size INTEGER NOT NULL,
+    value BLOB NOT NULL
+)'''
+
+DOCUMENT_DEFAULTS = dict(
+    (name, parameter.default)
+    for name, parameter in inspect.signature(Document.__init__).parameters.items()
+    if parameter.default is not parameter.empty)
+# Document arguments which do not change a complete result. Results cut
+# short by the deadline are not stored, and learned templates are meant to
+# give the same results.
+NOT_KEYED = ('debug', 'stats', 'trace', 'deadline', 'templates')
+# Expired results are deleted from the file when it is opened and then by
+# put() at most this often (or every max_age if shorter), in seconds.
+EXPIRE_INTERVAL = 60
+
+
+def result_key(html, fields, html_partial=False, output_format="html", **document_options):
+    """Hash of a page with everything changing what is extracted from it.
+    Document arguments left out and given their default value hash the
+    same."""
+    options = dict(DOCUMENT_DEFAULTS)
+    options.update(document_options)
+    for name in NOT_KEYED:
+        options.pop(name, None)
+    options['fields'] = sorted(fields)
+    options['html_partial'] = bool(html_partial)
+    options['output_format'] = output_format
+    digest = hashlib.sha256(KEY_VERSION.encode('utf-8'))
+    # Options are repr()ed when JSON cannot hold them, like compiled keyword
+    # regexps.
+    digest.update(json.dumps(options, sort_keys=True, default=repr).encode('utf-8'))
+    # Text and bytes pages are decoded differently.
+    if isinstance(html, str):
+        digest.update(b'str\0')
+        html = html.encode('utf-8', 'surrogatepass')
+    else:
+        digest.update(b'bytes\0')
+    digest.update(html)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Extraction results in a memory LRU in front of an optional sqlite
+    file.
+
+    :param path: sqlite file, None to keep results in memory only
+    :param memory_size: results kept in memory
+    :param max_bytes: size of the compressed results kept in the file,
+        the oldest are dropped first when it is exceeded
+    :param max_age: seconds a result is used for, None for ever. Older
+        results are deleted from the file whatever its size.
+
+    Results cut short by the deadline of Document are not stored, as
+    the next parse may well complete. The counters `memory_hits`,
+    `disk_hits`, `misses`, `stores` and `evictions` tell how the cache
+    works.
+    """
+
+    def __init__(self, path=None, memory_size=1024, max_bytes=1024 * 1024 * 1024, max_age=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.memory = LRUCache(memory_size)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.__lock = threading.Lock()
+        self.__db = None
+        self.__size = 0
+        self.__next_expiry = None
+        if path is not None:
+            self.__db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.__db.execute('PRAGMA journal_mode=WAL')
+            self.__db.execute(SCHEMA)
+            self.__db.execute('CREATE INDEX IF NOT EXISTS results_created ON results (created)')
+            self.__expire(time.time())
+            self.__db.commit()
+            self.__size = self.__db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    key = staticmethod(result_key)
+
+    def get(self, key):
+        """Fields stored for `key`, None if there are none or they are
+        too old."""
+        now = time.time()
+        entry = self.memory.get(key)
+        if entry is not None and self.__fresh(entry[0], now):
+            with self.__lock:
+                self.memory_hits += 1
+            return entry[1]
+
+        row = None
+        if self.__db is not None:
+            with self.__lock:
+                row = self.__db.execute(
+                    'SELECT created, value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is not None and self.__fresh(row[0], now):
+            fields = json.loads(zlib.decompress(row[1]).decode('utf-8'))
+            self.memory.put(key, (row[0], fields))
+            with self.__lock:
+                self.disk_hits += 1
+            return fields
+
+        with self.__lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, fields):
+        now = time.time()
+        self.memory.put(key, (now, fields))
+        with self.__lock:
+            self.stores += 1
+            if self.__db is None:
+                return
+            value = zlib.compress(json.dumps(fields).encode('utf-8'))
+            previous = self.__db.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+            self.__db.execute(
+                'INSERT OR REPLACE INTO results (key, created, size, value) VALUES (?, ?, ?, ?)',
+                (key, now, len(value), value))
+            self.__size += len(value) - (previous[0] if previous else 0)
+            if self.__next_expiry is not None and now >= self.__next_expiry:
+                self.__size -= self.__expire(now)
+            if self.__size > self.max_bytes:
+                self.__evict()
+            self.__db.commit()
+
+    def extract(self, html, fields, html_partial=False, output_format="html", **document_options):
+        """Fields of a page as batch.extract() gives them, from the cache
+        when it has them."""
+        if output_format == "element":
+            raise ValueError("elements cannot be cached")
+        key = self.key(html, fields, html_partial, output_format, **document_options)
+        values = self.get(key)
+        if values is None:
+            values, degraded = extract_document(
+                html, fields, html_partial, output_format, **document_options)
+            if 'deadline' not in degraded:
+                self.put(key, values)
+        return values
+
+    def hit_rate(self):
+        total = self.memory_hits + self.disk_hits + self.misses
+        return float(self.memory_hits + self.disk_hits) / total if total else 0.0
+
+    def counters(self):
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
+
+    def close(self):
+        with self.__lock:
+            if self.__db is not None:
+                self.__db.close()
+                self.__db = None
+
+    def __fresh(self, created, now):
+        return self.max_age is None or now - created <= self.max_age
+
+    def __expire(self, now):
+        """Drop the results older than max_age, return their size."""
+        if self.max_age is None:
+            self.__next_expiry = None
+            return 0
+        self.__next_expiry = now + min(self.max_age, EXPIRE_INTERVAL)
+        db = self.__db
+        before = now - self.max_age
+        size = db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results WHERE created < ?', (before,)).fetchone()[0]
+        self.evictions += db.execute('DELETE FROM results WHERE created < ?', (before,)).rowcount
+        return size
+
+    def __evict(self):
+        """Drop the oldest results until the file holds at most 90% of
+        max_bytes."""
+        db = self.__db
+        target = self.max_bytes * 0.9
+        self.__size = db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        while self.__size > target:
+            rows = db.execute('SELECT key, size FROM results ORDER BY created LIMIT 100').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.__size <= target:
+                    break
+                db.execute('DELETE FROM results WHERE key = ?', (key,))
+                self.__size -= size
+                self.evictions += 1
@@ -0,0 +1,185 @@
+import re
+
+from .lru import LRUCache
+
+# class/id strings remembered per classifier
+CACHE_SIZE = 8192
+# classifiers kept for different keyword settings
+MAX_CLASSIFIERS = 64
+
+UNLIKELY = 1
+MAYBE = 2
+POSITIVE = 4
+NEGATIVE = 8
+USER_POSITIVE = 16
+USER_NEGATIVE = 32
+
+escaped_re = re.compile(r'\\(.)', re.S)
+separator_re = re.compile(r'(?<!\\)\|')
+
+
+def keywords(pattern):
+    """Keywords of a regexp made by compile_pattern(), None for other
+    regexps."""
+    if pattern.groups or pattern.flags & ~(re.I | re.U) or not isinstance(pattern.pattern, str):
+        return None
+    words = []
+    for piece in separator_re.split(pattern.pattern):
+        word = escaped_re.sub(r'\1', piece)
+        if re.escape(word) != piece:
+            return None
+        words.append(word)
+    return words
+
+
+class KeywordScanner:
+    """Finds which of many literal keywords occur in a string.
+
+    The keywords are one regexp shaped as a prefix tree, so the regexp
+    engine tries each character once per position instead of once per
+    keyword. An empty group marks the end of every keyword, longer keywords
+    are tried first, so a match is the longest keyword at its position and
+    its flags include those of its prefixes. The search starts again one
+    character after each match, so overlapping keywords are found too.
+    """
+
+    def __init__(self, flagged_words, ignore_case):
+        tree = {}
+        for word, flag in flagged_words:
+            node = tree
+            for char in (word.lower() if ignore_case else word):
+                node = node.setdefault(char, {})
+            node[''] = node.get('', 0) | flag
+        self.__flags = [None]
+        self.__regex = re.compile(self.__branch(tree, 0),
+                                  re.I | re.U if ignore_case else re.U)
+
+    def __branch(self, node, flag):
+        if '' in node:
+            flag |= node['']
+        alternatives = [re.escape(char) + self.__branch(node[char], flag)
+                        for char in sorted(node) if char]
+        if '' in node:
+            self.__flags.append(flag)
+            alternatives.append('()')
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:%s)' % '|'.join(alternatives)
+
+    def scan(self, string):
+        found = 0
+        search = self.__regex.search
+        flags = self.__flags
+        end = len(string)
+        match = search(string)
+        while match is not None:
+            found |= flags[match.lastindex]
+            start = match.start() + 1
+            if start > end:
+                break
+            match = search(string, start)
+        return found
+
+
+class Classifier:
+    """Classifies class/id strings against all the keyword regexps at once.
+
+    The keywords of the regexps made by compile_pattern() are looked for
+    in one scan, see KeywordScanner (two when user keywords, which are case
+    sensitive, are set). Other regexps are searched apart. Results are kept
+    in a bounded LRU cache, shared by every document using the same
+    keywords, see get_classifier().
+    """
+
+    def __init__(self, unlikely, maybe, positive, negative,
+                 user_positive=None, user_negative=None):
+        self.tag_weights = {}
+        self.cache = LRUCache(CACHE_SIZE)
+        self.__user_positive = user_positive
+        self.__user_negative = user_negative
+        self.__separate = []
+        words = {True: [], False: []}
+        for flag, pattern in [(UNLIKELY, unlikely), (MAYBE, maybe), (POSITIVE, positive),
+                              (NEGATIVE, negative), (USER_POSITIVE, user_positive),
+                              (USER_NEGATIVE, user_negative)]:
+            if pattern is None:
+                continue
+            found = keywords(pattern)
+            if found is None:
+                self.__separate.append((flag, pattern))
+            else:
+                words[bool(pattern.flags & re.I)].extend((word, flag) for word in found)
+        self.__scanners = [KeywordScanner(flagged, ignore_case)
+                           for ignore_case, flagged in words.items() if flagged]
+
+    def classify(self, string):
+        """Return the flags of the keyword sets found in `string`"""
+        found = 0
+        for scanner in self.__scanners:
+            found |= scanner.scan(string)
+        for flag, pattern in self.__separate:
+            if pattern.search(string):
+                found |= flag
+        return found
+
+    def __entry(self, string):
+        entry = self.cache.get(string)
+        if entry is None:
+            found = self.classify(string)
+            weight = 0
+            if found & NEGATIVE:
+                weight -= 25
+            if found & POSITIVE:
+                weight += 25
+            if found & USER_POSITIVE:
+                weight += 25
+            if found & USER_NEGATIVE:
+                weight -= 25
+            entry = (bool(found & UNLIKELY and not found & MAYBE), weight)
+            self.cache.put(string, entry)
+        return entry
+
+    def is_unlikely(self, string):
+        """True if `string` names an unlikely candidate"""
+        return self.__entry(string)[0]
+
+    def weight(self, string):
+        """Score change for an element with `string` as class or id"""
+        return self.__entry(string)[1]
+
+    def tag_weight(self, tag):
+        """Score change for the user keywords matching "tag-<tag>" """
+        try:
+            return self.tag_weights[tag]
+        except KeyError:
+            pass
+        weight = 0
+        if self.__user_positive and self.__user_positive.match('tag-' + tag):
+            weight += 25
+        if self.__user_negative and self.__user_negative.match('tag-' + tag):
+            weight -= 25
+        if len(self.tag_weights) < 1024:
+            self.tag_weights[tag] = weight
+        return weight
+
+    def hit_rate(self):
+        return self.cache.hit_rate()
+
+
+_classifiers = LRUCache(MAX_CLASSIFIERS)
+
+
+def pattern_key(pattern):
+    if pattern is None:
+        return None
+    return pattern.pattern, pattern.flags
+
+
+def get_classifier(*patterns):
+    """Return the shared Classifier of these patterns (see Classifier)"""
+    key = tuple(pattern_key(pattern) for pattern in patterns)
+    classifier = _classifiers.get(key)
+    if classifier is None:
+        classifier = Classifier(*patterns)
+        _classifiers.put(key, classifier)
+    return classifier
@@ -1,5 +1,6 @@
 # strip out a set of nuisance html attributes that can mess up rendering in RSS feeds
 import re
+from lxml.etree import Element
 from lxml.html.clean import Cleaner
 
 bad_attrs = ["style", "[-a-z]*color", "background[-a-z]*", "on*", "class", "id"]
@@ -14,11 +15,32 @@ htmlstrip = re.compile("<" # open
     ">"        # end
 , re.I)
 
+bad_attrs_re = re.compile("(?:%s)" % '|'.join(bad_attrs), re.I)
+
 def clean_attributes(html):
     while htmlstrip.search(html):
         html = htmlstrip.sub('<\\1\\2>', html)
     return html
 
+def strip_attributes(doc, changed=None):
+    """Same as clean_attributes() but on the element tree, in place.
+
+    Attributes matching bad_attrs are removed from doc and all its
+    descendants when they have a value.
+
+    :param changed: list to append the ``(element, attributes)`` of every
+        element losing some to, with its attributes as they were.
+    """
+    for elem in doc.iter(Element):
+        attrib = elem.attrib
+        items = None
+        for name in attrib.keys():
+            if attrib[name] and bad_attrs_re.fullmatch(name):
+                if changed is not None and items is None:
+                    items = attrib.items()
+                    changed.append((elem, items))
+                del attrib[name]
+
 def normalize_spaces(s):
     if not s: return ''
     """replace any sequence of whitespace
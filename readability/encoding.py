@@ -1,42 +1,156 @@
+import codecs
 import re
 import chardet
 
-def get_encoding(page):
-    # Regex for XML and HTML Meta charset declaration
-    charset_re = re.compile(b'<meta.*?charset=["\']*(.+?)["\'>]', flags=re.I)
-    pragma_re = re.compile(b'<meta.*?content=["\']*;?charset=(.+?)["\'>]', flags=re.I)
-    xml_re = re.compile(b'^<\?xml.*?encoding=["\']*(.+?)["\'>]')
+from .lru import LRUCache
 
-    declared_encodings = (charset_re.findall(page) +
-            pragma_re.findall(page) +
-            xml_re.findall(page))
+# Charset declarations are only looked for in the first HEAD_SCAN_BYTES of
+# the page, and never after </head>.
+HEAD_SCAN_BYTES = 16 * 1024
+# Declared encodings are checked against this many bytes of the page.
+VALIDATE_BYTES = 64 * 1024
+# At most this many bytes of the page are handed to the detector.
+DETECT_SAMPLE_BYTES = 32 * 1024
+
+# Regex for XML and HTML Meta charset declaration
+charset_re = re.compile(b'<meta.*?charset=["\']*(.+?)["\'>]', flags=re.I)
+pragma_re = re.compile(b'<meta.*?content=["\']*;?charset=(.+?)["\'>]', flags=re.I)
+xml_re = re.compile(b'^<\\?xml.*?encoding=["\']*(.+?)["\'>]')
+head_end_re = re.compile(b'</head\\s*>', flags=re.I)
+tags_re = re.compile(b'</?[^>]*>\\s*')
+
+# UTF-32 goes first, its little endian BOM starts with the UTF-16 one.
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Encodings confirmed by a BOM, the HTTP header or a declaration, per host,
+# see set_host_cache(). None when disabled.
+host_encodings = None
+# Encodings of the host cache trusted without asking the detector, those a
+# page of another encoding hardly ever decodes with. Single byte encodings
+# decode any page.
+STRICT_ENCODINGS = ('utf-8',)
+
+
+def chardet_detector(sample):
+    return chardet.detect(sample)['encoding']
+
+_detector = chardet_detector
+
+
+def set_detector(detector):
+    """Replace the encoding detector used when nothing is declared.
+
+    `detector` is called with a bytes sample of the page (tags stripped) and
+    returns an encoding name or None. Passing None restores chardet.
+    """
+    global _detector
+    _detector = detector or chardet_detector
+
+
+def set_host_cache(cache=True):
+    """Remember per host the encodings confirmed by a BOM, the HTTP header
+    or a declaration, for the later pages of the host which declare none.
+
+    A remembered utf-8 is used when the page decodes with it, other
+    encodings only when the detector finds nothing. Results then depend on
+    the pages parsed before, which is why the cache is off by default.
+
+    :param cache: an LRUCache, True for a new one of 4096 hosts, None or
+        False to disable the cache
+    """
+    global host_encodings
+    if cache is True:
+        cache = LRUCache(4096)
+    elif cache is False:
+        cache = None
+    host_encodings = cache
+
+
+def detect_encoding(page, http_charset=None, host=None):
+    """Detect the encoding of `page` (bytes or another bytes-like object,
+    such as a memoryview or an mmap) and tell where it comes from.
+
+    Returns an ``(encoding, source)`` pair, `source` is one of "bom",
+    "http", "declared", "host", "detector" or "default".
+
+    :param http_charset: charset from the Content-Type response header
+    :param host: host the page was fetched from, for the per-host cache
+        (see set_host_cache())
+    """
+    for bom, encoding in BOMS:
+        if page[:len(bom)] == bom:
+            return encoding, 'bom'
+
+    if http_charset:
+        encoding = custom_decode(http_charset)
+        if is_valid_encoding(page, encoding):
+            remember_encoding(host, encoding)
+            return encoding, 'http'
+
+    head = page[:HEAD_SCAN_BYTES]
+    head_end = head_end_re.search(head)
+    if head_end:
+        head = head[:head_end.start()]
+
+    declared_encodings = (charset_re.findall(head) +
+            pragma_re.findall(head) +
+            xml_re.findall(head))
 
     # Try any declared encodings
-    if len(declared_encodings) > 0:
-        for declared_encoding in declared_encodings:
-            try:
-                declared_encoding = declared_encoding.decode("utf-8")
-                page.decode(custom_decode(declared_encoding))
-                return custom_decode(declared_encoding)
-            except UnicodeDecodeError:
-                pass
-
-    # Fallback to chardet if declared encodings fail
-    text = re.sub(b'</?[^>]*>\s*', b' ', page)
-    enc = 'utf-8'
-    if not text.strip() or len(text) < 10:
-        return enc # can't guess
-    res = chardet.detect(text)
-    enc = res['encoding']
-    #print '->', enc, "%.2f" % res['confidence']
-    enc = custom_decode(enc)
-    return enc
+    for declared_encoding in declared_encodings:
+        try:
+            encoding = custom_decode(declared_encoding.decode("utf-8"))
+        except UnicodeDecodeError:
+            continue
+        if is_valid_encoding(page, encoding):
+            remember_encoding(host, encoding)
+            return encoding, 'declared'
+
+    known = host_encodings.get(host) if host and host_encodings is not None else None
+    if known in STRICT_ENCODINGS and is_valid_encoding(page, known):
+        return known, 'host'
+
+    # Fallback to the detector if declared encodings fail
+    text = tags_re.sub(b' ', page[:DETECT_SAMPLE_BYTES])
+    detected = _detector(text) if text.strip() and len(text) >= 10 else None
+    if detected:
+        return custom_decode(detected), 'detector'
+    if known and is_valid_encoding(page, known):
+        return known, 'host'
+    return 'utf-8', 'default'  # can't guess
+
+
+def get_encoding(page, http_charset=None, host=None):
+    return detect_encoding(page, http_charset, host)[0]
+
+
+def is_valid_encoding(page, encoding):
+    """Check that the start of `page` decodes with `encoding`."""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        decoder.decode(page[:VALIDATE_BYTES], len(page) <= VALIDATE_BYTES)
+    except (LookupError, UnicodeDecodeError):
+        return False
+    return True
+
+
+def remember_encoding(host, encoding):
+    cache = host_encodings
+    if host and cache is not None and cache.get(host) != encoding:
+        cache.put(host, encoding)
+
 
 def custom_decode(encoding):
     """Overrides encoding when charset declaration
        or charset determination is a subset of a larger
        charset.  Created because of issues with Chinese websites"""
-    
+
     if not encoding:
         return "utf-8"
     encoding = encoding.lower()
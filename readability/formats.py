@@ -0,0 +1,241 @@
+"""Render an extracted article in other formats than html.
+
+    doc.parse(["summary"], output_format="text")
+    index(doc.summary())
+
+The formats are read from the cleaned tree itself: the html of the article
+is never serialized and parsed again.
+
+- html: the serialized tree, what summary() has always returned
+- text: plain text, blocks separated by an empty line
+- markdown: CommonMark
+- blocks: a list of dicts, ready for json.dumps(), see Blocks
+- element: the lxml element of the article
+"""
+import re
+
+from lxml.etree import tounicode
+from lxml.html.defs import block_tags
+
+OUTPUT_FORMATS = ("html", "text", "markdown", "blocks", "element")
+
+BLOCK_TAGS = (block_tags | frozenset([
+    "html", "body", "article", "section", "header", "footer", "main", "aside", "nav",
+    "figure", "figcaption", "details", "summary"])) - frozenset(["del", "ins"])
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# Tags making a table a layout table rather than a data table.
+LAYOUT_TAGS = ("p", "div", "table", "ul", "ol", "blockquote", "pre", "h1", "h2", "h3")
+
+space_re = re.compile(r'\s+')
+markdown_special_re = re.compile(r'([\\`*_\[\]<>])')
+line_start_re = re.compile(r'^(#|>|[-+] |\d+\. )', re.M)
+pipe_re = re.compile(r'\|')
+
+
+def normalize(text):
+    """Fold spaces, keep the newlines of <br>s, strip."""
+    text = re.sub(r' *\n *', '\n', re.sub(' {2,}', ' ', text))
+    return text.strip(' \n')
+
+
+class PlainInline:
+    """Text of inline content."""
+
+    def text(self, text):
+        return space_re.sub(' ', text)
+
+    def element(self, elem):
+        parts = []
+        self.children(elem, parts)
+        return ''.join(parts)
+
+    def children(self, elem, parts):
+        if elem.text:
+            parts.append(self.text(elem.text))
+        for child in elem:
+            if isinstance(child.tag, str):
+                parts.append(self.child(child))
+            if child.tail:
+                parts.append(self.text(child.tail))
+
+    def child(self, elem):
+        if elem.tag == 'br':
+            return '\n'
+        content = self.element(elem)
+        if elem.tag in BLOCK_TAGS:
+            return ' %s ' % content
+        return content
+
+
+class MarkdownInline(PlainInline):
+    """CommonMark of inline content."""
+
+    def text(self, text):
+        return markdown_special_re.sub(r'\\\1', space_re.sub(' ', text))
+
+    def child(self, elem):
+        tag = elem.tag
+        if tag == 'br':
+            return '\\\n'
+        if tag == 'img':
+            src = elem.get('src')
+            return '![%s](%s)' % (self.text(elem.get('alt', '')), src) if src else ''
+        content = self.element(elem)
+        if tag == 'a' and elem.get('href') and content.strip():
+            return '[%s](%s)' % (content.strip(), elem.get('href').replace(' ', '%20'))
+        if tag in ('b', 'strong') and content.strip():
+            return '**%s**' % content.strip()
+        if tag in ('i', 'em') and content.strip():
+            return '*%s*' % content.strip()
+        if tag == 'code' and content.strip():
+            code = elem.text_content()
+            fence = '``' if '`' in code else '`'
+            return '%s%s%s' % (fence, code, fence)
+        if tag in BLOCK_TAGS:
+            return ' %s ' % content
+        return content
+
+
+class Blocks:
+    """The blocks of an article, as dicts with a "type":
+
+    - heading: "level" (1 to 6) and "text"
+    - paragraph: "text"
+    - list: "ordered" and the "items" texts
+    - quote: "text"
+    - code: "text", as it is
+    - image: "src" and "alt"
+    - table: "rows", lists of cell texts
+
+    Texts are made by `inline`, PlainInline or MarkdownInline.
+    """
+
+    def __init__(self, inline):
+        self.inline = inline
+        self.blocks = []
+        self.__pending = []
+
+    def walk(self, elem):
+        inline = self.inline
+        if elem.text:
+            self.__pending.append(inline.text(elem.text))
+        for child in elem:
+            if isinstance(child.tag, str):
+                self.visit(child)
+            if child.tail:
+                self.__pending.append(inline.text(child.tail))
+
+    def visit(self, elem):
+        tag = elem.tag
+        inline = self.inline
+        if tag not in BLOCK_TAGS and tag != 'img':
+            self.__pending.append(inline.child(elem))
+            return
+        self.flush()
+        if tag in HEADING_TAGS:
+            self.add('heading', level=HEADING_TAGS[tag], text=normalize(inline.element(elem)))
+        elif tag == 'p':
+            self.add('paragraph', text=normalize(inline.element(elem)))
+        elif tag in ('ul', 'ol'):
+            items = [normalize(inline.element(item)) for item in elem.iterchildren('li')]
+            items = [item for item in items if item]
+            if items:
+                self.blocks.append({'type': 'list', 'ordered': tag == 'ol', 'items': items})
+        elif tag == 'blockquote':
+            self.add('quote', text=normalize(inline.element(elem)))
+        elif tag == 'pre':
+            text = elem.text_content().strip('\n')
+            if text.strip():
+                self.blocks.append({'type': 'code', 'text': text})
+        elif tag == 'img':
+            if elem.get('src'):
+                self.blocks.append({'type': 'image', 'src': elem.get('src'), 'alt': elem.get('alt', '')})
+        elif tag == 'table' and not any(True for _ in elem.iterdescendants(*LAYOUT_TAGS)):
+            rows = []
+            for row in elem.iter('tr'):
+                cells = [normalize(inline.element(cell)) for cell in row.iterchildren('td', 'th')]
+                if any(cells):
+                    rows.append(cells)
+            if rows:
+                self.blocks.append({'type': 'table', 'rows': rows})
+        else:
+            self.walk(elem)
+            self.flush()
+
+    def add(self, type, **block):
+        if block['text']:
+            block['type'] = type
+            self.blocks.append(block)
+
+    def flush(self):
+        text = normalize(''.join(self.__pending))
+        self.__pending = []
+        if text:
+            self.blocks.append({'type': 'paragraph', 'text': text})
+
+
+def article_blocks(elem, inline=None):
+    blocks = Blocks(inline or PlainInline())
+    blocks.visit(elem)
+    blocks.flush()
+    return blocks.blocks
+
+
+def to_text(elem):
+    parts = []
+    for block in article_blocks(elem):
+        kind = block['type']
+        if kind == 'list':
+            parts.append('\n'.join(block['items']))
+        elif kind == 'table':
+            parts.append('\n'.join('\t'.join(row) for row in block['rows']))
+        elif kind != 'image':
+            parts.append(block['text'])
+    return '\n\n'.join(parts)
+
+
+def to_markdown(elem):
+    parts = []
+    for block in article_blocks(elem, MarkdownInline()):
+        kind = block['type']
+        if kind == 'heading':
+            parts.append('#' * block['level'] + ' ' + block['text'].replace('\\\n', ' '))
+        elif kind == 'paragraph':
+            parts.append(line_start_re.sub(r'\\\1', block['text']))
+        elif kind == 'list':
+            items = []
+            for number, item in enumerate(block['items'], 1):
+                marker = '%d. ' % number if block['ordered'] else '- '
+                items.append(marker + item.replace('\n', '\n' + ' ' * len(marker)))
+            parts.append('\n'.join(items))
+        elif kind == 'quote':
+            parts.append('> ' + block['text'].replace('\n', '\n> '))
+        elif kind == 'code':
+            fence = '````' if '```' in block['text'] else '```'
+            parts.append('%s\n%s\n%s' % (fence, block['text'], fence))
+        elif kind == 'image':
+            parts.append('![%s](%s)' % (block['alt'], block['src']))
+        elif kind == 'table':
+            rows = [[pipe_re.sub(r'\\|', cell).replace('\\\n', ' ') for cell in row] for row in block['rows']]
+            width = max(len(row) for row in rows)
+            rows = [row + [''] * (width - len(row)) for row in rows]
+            lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + ' --- |' * width]
+            lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+            parts.append('\n'.join(lines))
+    return '\n\n'.join(parts)
+
+
+def render(elem, output_format):
+    """`elem` in one of OUTPUT_FORMATS."""
+    if output_format == 'html':
+        return tounicode(elem)
+    if output_format == 'text':
+        return to_text(elem)
+    if output_format == 'markdown':
+        return to_markdown(elem)
+    if output_format == 'blocks':
+        return article_blocks(elem)
+    if output_format == 'element':
+        return elem
+    raise ValueError("unknown output format %r, expected one of %s" % (
+        output_format, ", ".join(OUTPUT_FORMATS)))
@@ -1,22 +1,155 @@
-from .cleaners import normalize_spaces, clean_attributes
-from .encoding import get_encoding
+from .cleaners import normalize_spaces, strip_attributes
+from .encoding import detect_encoding
+from .encoding import head_end_re
 from lxml.html import tostring
+import lxml.etree
 import lxml.html
 
+import codecs
 import re
-import logging
+import threading
 
 utf8_parser = lxml.html.HTMLParser(encoding='utf-8')
 
-def build_doc(page):
+# Python codecs libxml2 knows under another name.
+LXML_ENCODINGS = {
+    'utf-8-sig': 'utf-8',
+}
+ENCODING_ERRORS = [
+    lxml.etree.ErrorTypes.ERR_INVALID_ENCODING,
+    lxml.etree.ErrorTypes.ERR_UNSUPPORTED_ENCODING,
+]
+MAX_PARSERS = 32
+# Bytes copied at once when lxml cannot parse a buffer in place.
+FEED_SIZE = 64 * 1024
+# </head> is looked for in this many bytes (characters of str pages) when
+# only the head of a page is parsed.
+HEAD_MAX_BYTES = 256 * 1024
+head_end_str_re = re.compile('</head\\s*>', flags=re.I)
+# Parsers keep the error log of their last run, so every thread gets its own.
+_parsers = threading.local()
+
+
+def get_parser(encoding):
+    """Return a cached HTMLParser decoding `encoding` natively, or None if
+    libxml2 does not support it."""
+    try:
+        parsers = _parsers.cache
+    except AttributeError:
+        parsers = _parsers.cache = {}
+    if encoding in parsers:
+        return parsers[encoding]
+
+    parser = new_parser(encoding)
+    if len(parsers) < MAX_PARSERS:
+        parsers[encoding] = parser
+    return parser
+
+
+def new_parser(encoding):
+    """Return a new HTMLParser decoding `encoding` natively, or None if
+    libxml2 does not support it."""
+    names = [LXML_ENCODINGS.get(encoding, encoding)]
+    try:
+        names.append(codecs.lookup(encoding).name)
+    except LookupError:
+        pass
+    for name in names:
+        try:
+            return lxml.html.HTMLParser(encoding=name)
+        except LookupError:
+            pass
+    return None
+
+
+def has_encoding_errors(parser):
+    """True if the last document parsed by `parser` had bytes invalid in
+    its encoding."""
+    return bool(parser.error_log.filter_types(ENCODING_ERRORS) or
+                parser.error_log.filter_domains(lxml.etree.ErrorDomains.I18N))
+
+
+def parse_bytes(page, encoding):
+    """Parse `page` with libxml2 decoding it from `encoding` itself.
+
+    Falls back to parse_transcoded() if libxml2 does not know the encoding
+    or the page has bytes invalid in it.
+    """
+    parser = get_parser(encoding)
+    if parser is not None:
+        doc = parse_buffer(page, parser)
+        if not has_encoding_errors(parser):
+            return doc
+    return parse_transcoded(page, encoding)
+
+
+def parse_buffer(page, parser):
+    """lxml.html.document_fromstring() for bytes or another bytes-like page.
+
+    Recent lxml versions parse buffers in place. Older ones only take
+    bytes; the page is then fed to them FEED_SIZE bytes at a time rather
+    than copied whole.
+    """
+    if isinstance(page, bytes):
+        return lxml.html.document_fromstring(page, parser=parser)
+    try:
+        return lxml.html.document_fromstring(page, parser=parser)
+    except (TypeError, ValueError):
+        pass
+    view = buffer_view(page)
+    for start in range(0, len(view), FEED_SIZE):
+        parser.feed(bytes(view[start:start + FEED_SIZE]))
+    doc = parser.close() if len(view) else None
+    if doc is None:
+        raise lxml.etree.ParserError("Document is empty")
+    return doc
+
+
+def buffer_view(page):
+    """Flat byte view of a bytes-like page: a memoryview, a bytearray or an
+    mmap. Slicing it does not copy."""
+    view = memoryview(page)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+def parse_transcoded(page, encoding):
+    try:
+        page_unicode = str(page, encoding, 'replace')
+    except LookupError:
+        # Neither libxml2 nor Python know the encoding, which a detector,
+        # unlike declarations, is not checked for.
+        page_unicode = str(page, 'utf-8', 'replace')
+    return lxml.html.document_fromstring(page_unicode.encode('utf-8', 'replace'), parser=utf8_parser)
+
+
+def page_encoding(page, http_charset=None, host=None):
+    """Return the ``(encoding, source)`` of a bytes page, see
+    detect_encoding(). str pages need no decoding and give (None, None)."""
     if isinstance(page, str):
-        enc = None
-        page_unicode = page
-    else:
-        enc = get_encoding(page) or 'utf-8'
-        page_unicode = page.decode(enc, 'replace')
-    doc = lxml.html.document_fromstring(page_unicode.encode('utf-8', 'replace'), parser=utf8_parser)
-    return doc, enc
+        return None, None
+    enc, source = detect_encoding(page, http_charset, host)
+    return enc or 'utf-8', source
+
+
+def parse_page(page, encoding):
+    if isinstance(page, str):
+        return lxml.html.document_fromstring(page.encode('utf-8', 'replace'), parser=utf8_parser)
+    return parse_bytes(page, encoding)
+
+
+def head_end(page, limit=HEAD_MAX_BYTES):
+    """Offset just after the </head> of `page`, a str or a bytes-like
+    object, None if it is not in the first `limit` bytes."""
+    pattern = head_end_str_re if isinstance(page, str) else head_end_re
+    match = pattern.search(page, 0, limit)
+    return match.end() if match else None
+
+
+def build_doc(page, http_charset=None, host=None):
+    enc = page_encoding(page, http_charset, host)[0]
+    return parse_page(page, enc), enc
 
 def js_re(src, pattern, flags, repl):
     return re.compile(pattern, flags).sub(src, repl.replace('$', '\\'))
@@ -42,6 +175,50 @@ def normalize_entities(cur_title):
 def norm_title(title):
     return normalize_entities(normalize_spaces(title))
 
+def selector_xpath(selectors, tags=()):
+    """XPath finding, in one walk of the tree, the elements which may have
+    one of the `selectors`, ("id", name) or ("class", name) pairs, and
+    those of the `tags`. Classes are only looked for as substrings, which
+    is much cheaper in libxml2 than splitting them: check the elements
+    with matched_selectors()."""
+    ids = [name for kind, name in selectors if kind == 'id']
+    classes = [name for kind, name in selectors if kind == 'class']
+    # "head" also finds "heading" and "small_header_red".
+    classes = [name for name in classes if not any(other != name and other in name for other in classes)]
+    tests = []
+    if ids:
+        tests.append('@id and (%s)' % ' or '.join("@id = '%s'" % name for name in ids))
+    if classes:
+        tests.append('@class and (%s)' % ' or '.join("contains(@class, '%s')" % name for name in classes))
+    tests.extend('self::%s' % tag for tag in tags)
+    return lxml.etree.XPath('descendant-or-self::*[%s]' % ' or '.join(tests))
+
+
+def matched_selectors(elem, selectors):
+    """The `selectors` of selector_xpath() `elem` has, as cssselect
+    matches #name and .name."""
+    keys = [('id', elem.get('id'))]
+    keys.extend(('class', name) for name in xml_space_re.split(elem.get('class') or '') if name)
+    return [key for key in keys if key in selectors]
+
+
+xml_space_re = re.compile('[ \t\r\n]+')
+TITLE_SELECTORS = [
+    ('id', 'title'), ('id', 'head'), ('id', 'heading'),
+    ('class', 'pageTitle'), ('class', 'news_title'), ('class', 'title'), ('class', 'head'),
+    ('class', 'heading'), ('class', 'contentheading'), ('class', 'small_header_red'),
+]
+TITLE_TAGS = ('h1', 'h2', 'h3')
+title_candidates_xpath = selector_xpath(TITLE_SELECTORS, TITLE_TAGS)
+# Elements holding the image of pages without one in their meta tags, by
+# preference.
+IMAGE_WRAPPERS = [
+    ('id', 'content'), ('id', 'content-wrapper'), ('id', 'wrapper'),
+    ('class', 'content'), ('class', 'content-wrapper'), ('class', 'wrapper'),
+]
+image_wrappers_xpath = selector_xpath(IMAGE_WRAPPERS)
+
+
 def get_title(doc):
     title = doc.find('.//title')
     if title is None or title.text is None or len(title.text) == 0:
@@ -64,19 +241,13 @@ def shorten_title(doc):
 
     candidates = set()
 
-    for item in ['.//h1', './/h2', './/h3']:
-        for e in list(doc.iterfind(item)):
-            if e.text:
-                add_match(candidates, e.text, orig)
-            if e.text_content():
-                add_match(candidates, e.text_content(), orig)
-
-    for item in ['#title', '#head', '#heading', '.pageTitle', '.news_title', '.title', '.head', '.heading', '.contentheading', '.small_header_red']:
-        for e in doc.cssselect(item):
-            if e.text:
-                add_match(candidates, e.text, orig)
-            if e.text_content():
-                add_match(candidates, e.text_content(), orig)
+    for e in title_candidates_xpath(doc):
+        if e.tag not in TITLE_TAGS and not matched_selectors(e, TITLE_SELECTORS):
+            continue
+        if e.text:
+            add_match(candidates, e.text, orig)
+        if e.text_content():
+            add_match(candidates, e.text_content(), orig)
 
     if candidates:
         title = sorted(candidates, key=len)[-1]
@@ -106,20 +277,14 @@ def shorten_title(doc):
 def get_body(doc):
     [ elem.drop_tree() for elem in doc.xpath('.//script | .//link | .//style') ]
 
-    raw_html = tostring(doc.body if len(doc.body) else doc, encoding='unicode')
-
-
-    try:
-        cleaned = clean_attributes(raw_html)
-        return cleaned
-    except Exception:
-        logging.error("cleansing broke html content: %s\n---------\n%s" % (raw_html, cleaned))
-        return raw_html
+    body = doc.body if len(doc.body) else doc
+    strip_attributes(body)
+    return tostring(body, encoding='unicode')
 
 def get_first_image_url(doc):
-    images = doc.cssselect('img')
-    if images:
-        return images[0].get("src")
+    image = next(doc.iter('img'), None)
+    if image is not None:
+        return image.get("src")
     else:
         return None
 
@@ -139,9 +304,8 @@ def get_image_from_meta(doc):
     return None
 
 def get_lead(doc):
-    paragraphs = doc.cssselect("p")
-    if paragraphs:
-        lead = paragraphs[0]
+    lead = next(doc.iter('p'), None)
+    if lead is not None:
         lead = lead.text_content()
         if len(lead) > 40 and len(lead) < 300:
             lead = " ".join(lead.split())
@@ -161,24 +325,21 @@ BAD_IMAGE_PATTERN = re.compile("avatar", re.I)
 BAD_IMAGE_BLOCK_PATTERN = re.compile("comment", re.I)
 
 def get_image_in_bad_site(doc):
-
-    items  = [
-        "#content", "#content-wrapper", "#wrapper",
-        ".content", ".content-wrapper", ".wrapper"
-    ]
-    for item in items:
-        wrapper = None
-        elements = doc.cssselect(item)
-        for elem in elements:
-            if not test_upper_path(elem, BAD_IMAGE_BLOCK_PATTERN):
-                wrapper = elem
-                break
-
+    # First element of each selector outside of comment blocks, found in
+    # one pass over the elements matching any of them.
+    wrappers = {}
+    for elem in image_wrappers_xpath(doc):
+        keys = [key for key in matched_selectors(elem, IMAGE_WRAPPERS) if key not in wrappers]
+        if keys and not test_upper_path(elem, BAD_IMAGE_BLOCK_PATTERN):
+            wrappers.update(dict.fromkeys(keys, elem))
+
+    for key in IMAGE_WRAPPERS:
+        wrapper = wrappers.get(key)
         if wrapper is not None:
-            images = wrapper.cssselect("img")
-            if images:
-                if BAD_IMAGE_PATTERN.search(images[0].get("src", "")):
+            image = next(wrapper.iter('img'), None)
+            if image is not None:
+                if BAD_IMAGE_PATTERN.search(image.get("src", "")):
                     continue
-                return images[0].get("src")
+                return image.get("src")
 
     return None
@@ -0,0 +1,174 @@
+"""Metadata of a page: OpenGraph and Twitter tags, canonical URL,
+description, dates, language and JSON-LD.
+
+    doc.parse(["metadata"])
+    doc.metadata()["published_time"]
+
+The <head> is read in one walk over its children, and the JSON-LD scripts
+before the Cleaner removes them. Document.title() and main_image_url() are
+taken from the same walk.
+"""
+import json
+
+from .htmls import norm_title
+
+# Lowercased <meta name> of the publication and modification dates, by
+# preference.
+PUBLISHED_NAMES = (
+    "article:published_time", "pubdate", "publishdate", "date",
+    "dc.date.issued", "dcterms.issued", "dc.date")
+MODIFIED_NAMES = ("article:modified_time", "last-modified", "dcterms.modified")
+# Wrappers some sites put around the JSON of their ld+json scripts.
+JSON_WRAPPERS = (("<!--", "-->"), ("<![CDATA[", "]]>"))
+
+
+def read_metadata(doc, json_ld=True):
+    """Metadata of the page `doc`, a dict of:
+
+    - title: text of the <title>, as Document.title(), None without one
+    - headline: og:title, twitter:title or the JSON-LD headline
+    - description: description meta, og:description, twitter:description
+      or the JSON-LD description
+    - image: og:image or twitter:image:src (see meta_image()), else
+      twitter:image or the JSON-LD image
+    - canonical: <link rel="canonical">, else og:url
+    - lang: lang of <html>, else the Content-Language meta
+    - site_name, author, published_time, modified_time: from the meta
+      tags, else from JSON-LD
+    - opengraph: content of the <meta property> tags (og:, article:...) by
+      property
+    - twitter: content of the <meta name="twitter:..."> tags by name
+    - meta: content of the other <meta name> tags by lowercased name
+    - json_ld: objects of the application/ld+json scripts, with @graph
+      flattened, not read when `json_ld` is False
+
+    Only the tags directly in <head> count, and the first of repeated
+    tags. Values are strings as written in the page, or None.
+    """
+    opengraph = {}
+    twitter = {}
+    meta = {}
+    title = canonical = content_language = None
+    heads = doc.iterchildren('head') if doc.tag == 'html' else ()
+    for head in heads:
+        # The first <title> of the page is found here, unless an element
+        # before it could hold one.
+        nested = title is not None or any(
+            isinstance(elem.tag, str) for elem in head.itersiblings(preceding=True))
+        for child in head:
+            tag = child.tag
+            if tag == 'meta':
+                content = child.get('content')
+                if child.get('property'):
+                    opengraph.setdefault(child.get('property'), content)
+                name = child.get('name')
+                if name and name.startswith('twitter:'):
+                    twitter.setdefault(name, content)
+                elif name:
+                    meta.setdefault(name.lower(), content)
+                elif (child.get('http-equiv') or '').lower() == 'content-language':
+                    content_language = content_language or content
+            elif tag == 'title':
+                if title is None and not nested:
+                    title = child
+            elif tag == 'link':
+                if canonical is None and 'canonical' in (child.get('rel') or '').lower().split():
+                    canonical = child.get('href')
+            if len(child):
+                nested = True
+    if title is None:
+        title = doc.find('.//title')
+
+    objects = json_ld_objects(doc) if json_ld else []
+    return {
+        'title': None if title is None else norm_title(title.text or ''),
+        'headline': first(opengraph.get('og:title'), twitter.get('twitter:title'),
+                          ld_value(objects, 'headline')),
+        'description': first(meta.get('description'), opengraph.get('og:description'),
+                             twitter.get('twitter:description'), ld_value(objects, 'description')),
+        'image': first(opengraph.get('og:image'), twitter.get('twitter:image:src'),
+                       twitter.get('twitter:image'), ld_value(objects, 'image', 'url', 'contentUrl')),
+        'canonical': first(canonical, opengraph.get('og:url')),
+        'lang': first(doc.get('lang'), doc.get('{http://www.w3.org/XML/1998/namespace}lang'),
+                      content_language),
+        'site_name': first(opengraph.get('og:site_name'), ld_value(objects, 'publisher', 'name')),
+        'author': first(meta.get('author'), opengraph.get('article:author'),
+                        ld_value(objects, 'author', 'name')),
+        'published_time': first(opengraph.get('article:published_time'),
+                                *[meta.get(name) for name in PUBLISHED_NAMES],
+                                ld_value(objects, 'datePublished')),
+        'modified_time': first(opengraph.get('article:modified_time'), opengraph.get('og:updated_time'),
+                               *[meta.get(name) for name in MODIFIED_NAMES],
+                               ld_value(objects, 'dateModified')),
+        'opengraph': opengraph,
+        'twitter': twitter,
+        'meta': meta,
+        'json_ld': objects,
+    }
+
+
+def meta_image(metadata):
+    """og:image, else twitter:image:src, as get_image_from_meta() finds
+    them."""
+    return metadata['opengraph'].get('og:image') or metadata['twitter'].get('twitter:image:src') or None
+
+
+def first(*values):
+    for value in values:
+        if value:
+            return value
+    return None
+
+
+def json_ld_objects(doc):
+    """Objects of the application/ld+json scripts of `doc`, article
+    types first. Scripts which are not valid JSON are skipped."""
+    objects = []
+    for script in doc.iter('script'):
+        if (script.get('type') or '').strip().lower() != 'application/ld+json' or not script.text:
+            continue
+        text = script.text.strip()
+        for start, end in JSON_WRAPPERS:
+            if text.startswith(start) and text.endswith(end):
+                text = text[len(start):-len(end)].strip()
+        try:
+            data = json.loads(text.rstrip(';'))
+        except ValueError:
+            continue
+        add_objects(data, objects)
+    objects.sort(key=lambda obj: not is_article(obj))
+    return objects
+
+
+def add_objects(data, objects):
+    if isinstance(data, list):
+        for item in data:
+            add_objects(item, objects)
+    elif isinstance(data, dict):
+        if set(data) - {'@context', '@graph'}:
+            objects.append(data)
+        if '@graph' in data:
+            add_objects(data['@graph'], objects)
+
+
+def is_article(obj):
+    types = obj.get('@type')
+    if isinstance(types, str):
+        types = [types]
+    if not isinstance(types, list):
+        return False
+    return any(isinstance(t, str) and t.endswith(('Article', 'Posting')) for t in types)
+
+
+def ld_value(objects, key, *subkeys):
+    """First string `key` of the JSON-LD `objects`. Lists give their first
+    item, objects their first `subkeys` string."""
+    for obj in objects:
+        value = obj.get(key)
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, dict):
+            value = first(*[value.get(subkey) for subkey in subkeys])
+        if isinstance(value, str) and value.strip():
+            return value
+    return None
@@ -0,0 +1,195 @@
+import re
+from operator import add
+
+from lxml.etree import Element
+
+blank_re = re.compile('[ \t]+')
+clean_re = re.compile('[ \t]{2,}')
+newline_re = re.compile('\\s*\n\\s*')
+
+# Tags counted below an element by tag_counts().
+COUNTED_TAGS = ('p', 'img', 'li', 'a', 'embed', 'input')
+NO_COUNTS = (0,) * len(COUNTED_TAGS)
+TAG_UNITS = dict(
+    (tag, tuple(int(other == tag) for other in COUNTED_TAGS)) for tag in COUNTED_TAGS)
+
+
+# The scoring code measures text as len(clean(text_content())), where
+# clean() folds every whitespace run holding a newline into "\n", every
+# run of two or more blanks into " " and strips the result. That length is
+# rebuilt here from the children: a text is summarized as (length, leading
+# run, trailing run), and only the runs meeting at a join need to be looked
+# at again. A run is (has newline, other whitespace chars, blank groups,
+# starts with blank, ends with blank).
+
+def run_summary(run):
+    if not run:
+        return None
+    blanks = run.count(' ') + run.count('\t')
+    return (
+        '\n' in run,
+        len(run) - blanks,
+        len(blank_re.findall(run)) if blanks else 0,
+        run[0] in ' \t',
+        run[-1] in ' \t')
+
+
+def join_runs(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (
+        a[0] or b[0],
+        a[1] + b[1],
+        a[2] + b[2] - (1 if a[4] and b[3] else 0),
+        a[3],
+        b[4])
+
+
+def run_length(run):
+    """Length of a whitespace run inside a text once cleaned"""
+    if run is None:
+        return 0
+    if run[0]:
+        return 1
+    return run[1] + run[2]
+
+
+EMPTY = (None, None, None)
+
+
+def text_summary(text):
+    if not text:
+        return EMPTY
+    stripped = text.strip()
+    if not stripped:
+        run = run_summary(text)
+        return (None, run, run)
+    start = text.index(stripped[0])
+    end = start + len(stripped)
+    length = len(clean_re.sub(' ', newline_re.sub('\n', stripped)))
+    return (length, run_summary(text[:start]), run_summary(text[end:]))
+
+
+def join_texts(a, b):
+    if a[0] is None:
+        if b[0] is None:
+            run = join_runs(a[1], b[1])
+            return (None, run, run)
+        return (b[0], join_runs(a[1], b[1]), b[2])
+    if b[0] is None:
+        return (a[0], a[1], join_runs(a[2], b[1]))
+    return (a[0] + run_length(join_runs(a[2], b[1])) + b[0], a[1], b[2])
+
+
+class TextMetrics:
+    """Text length, link text length and comma count of every element.
+
+    The index is built in one bottom-up pass over `root`. Elements created
+    later are measured on first use. Code changing the text below an
+    element has to call invalidate() on it (or on the parent of a dropped
+    node), which forgets the element and its ancestors only; they are
+    measured again from their children when asked for.
+
+    The counts of COUNTED_TAGS below an element are only taken when asked
+    for, from the counts of its children, and forgotten the same way.
+    """
+
+    def __init__(self, root, known=None):
+        """:param known: measurements still valid for elements of `root`,
+        see save(). They are not taken again."""
+        self.__entries = entries = known if known is not None else {}
+        for elem in reversed(list(root.iter(Element))):
+            if elem not in entries:
+                entries[elem] = self.__measure(elem)
+        self.__counts = {}
+
+    def __measure(self, elem):
+        entries = self.__entries
+        text = text_summary(elem.text)
+        commas = elem.text.count(',') if elem.text else 0
+        link_length = 0
+        for child in elem:
+            if isinstance(child.tag, str):
+                entry = entries[child]
+                text = join_texts(text, entry[0])
+                commas += entry[2]
+                link_length += entry[1]
+                if child.tag == 'a':
+                    link_length += entry[0][0] or 0
+            if child.tail:
+                text = join_texts(text, text_summary(child.tail))
+                commas += child.tail.count(',')
+        return (text, link_length, commas)
+
+    def __entry(self, elem):
+        entries = self.__entries
+        entry = entries.get(elem)
+        if entry is not None:
+            return entry
+
+        stack = [elem]
+        while stack:
+            node = stack[-1]
+            missing = [child for child in node
+                       if isinstance(child.tag, str) and child not in entries]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            entries[node] = self.__measure(node)
+        return entries[elem]
+
+    def save(self):
+        """Copy of the measurements taken so far, for the `known` argument
+        of a new index."""
+        return dict(self.__entries)
+
+    def invalidate(self, elem):
+        entries = self.__entries
+        counts = self.__counts
+        while elem is not None:
+            entries.pop(elem, None)
+            counts.pop(elem, None)
+            elem = elem.getparent()
+
+    def tag_counts(self, elem):
+        """Number of elements of each of COUNTED_TAGS below `elem`, as a
+        dict, like len(elem.findall('.//' + tag))."""
+        counts = self.__counts
+        stack = [] if elem in counts else [elem]
+        while stack:
+            node = stack[-1]
+            missing = [child for child in node
+                       if isinstance(child.tag, str) and child not in counts]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            total = NO_COUNTS
+            for child in node:
+                tag = child.tag
+                if not isinstance(tag, str):
+                    continue
+                child_counts = counts[child]
+                if child_counts is not NO_COUNTS:
+                    total = child_counts if total is NO_COUNTS else tuple(map(add, total, child_counts))
+                unit = TAG_UNITS.get(tag)
+                if unit is not None:
+                    total = unit if total is NO_COUNTS else tuple(map(add, total, unit))
+            counts[node] = total
+        return dict(zip(COUNTED_TAGS, counts[elem]))
+
+    def text_length(self, elem):
+        return self.__entry(elem)[0][0] or 0
+
+    def link_length(self, elem):
+        return self.__entry(elem)[1]
+
+    def comma_count(self, elem):
+        return self.__entry(elem)[2]
+
+    def link_density(self, elem):
+        entry = self.__entry(elem)
+        return float(entry[1]) / max(entry[0][0] or 0, 1)
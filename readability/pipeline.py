@@ -0,0 +1,346 @@
+"""Asyncio fetch and extract pipeline.
+
+Pages are fetched with a small HTTP/1.1 client that keeps connections
+alive per host and decodes gzip/deflate bodies while they arrive. The
+extraction runs in an executor so the event loop never waits on lxml, and
+a bounded queue between both stages makes the fetchers wait when
+extraction falls behind.
+
+    async for url, result in extract_urls(urls, fields=["title", "summary"]):
+        ...
+"""
+import asyncio
+import ssl
+from collections import deque
+from collections import namedtuple
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
+
+from .batch import extract
+from .builder import decompressor
+
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/36.0.1985.103 Safari/537.36")
+READ_SIZE = 64 * 1024
+REDIRECTS = (301, 302, 303, 307, 308)
+
+Response = namedtuple('Response', ['url', 'status', 'headers', 'body'])
+# Either `fields` or `error` is set.
+PipelineResult = namedtuple('PipelineResult', ['response', 'fields', 'error'])
+
+
+class FetchError(Exception):
+    pass
+
+
+def content_decoder(encoding):
+    try:
+        return decompressor(encoding)
+    except ValueError as e:
+        raise FetchError(str(e))
+
+
+def http_charset(headers):
+    for param in headers.get('content-type', '').split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            return value.strip().strip('"\'') or None
+    return None
+
+
+def host_key(parts):
+    """(scheme, host, port) of a urlsplit() url, the unit of the per host
+    limits."""
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return (parts.scheme, parts.hostname, port)
+
+
+def url_host(url):
+    """host_key() of `url`, None when it has no valid one."""
+    try:
+        return host_key(urlsplit(url))
+    except ValueError:
+        return None
+
+
+class Fetcher:
+    """HTTP/1.1 client with keep-alive connections and concurrency limits.
+
+    :param concurrency: requests in flight over all hosts
+    :param per_host: requests in flight per host
+    :param timeout: seconds allowed for a whole request
+    :param max_size: largest decoded body accepted, in bytes
+    """
+
+    def __init__(self, concurrency=32, per_host=4, timeout=30,
+                 max_size=32 * 1024 * 1024, user_agent=USER_AGENT, max_redirects=5):
+        self.timeout = timeout
+        self.max_size = max_size
+        self.user_agent = user_agent
+        self.max_redirects = max_redirects
+        self.per_host = per_host
+        self.connections_opened = 0
+        self.__semaphore = asyncio.Semaphore(concurrency)
+        # (semaphore, requests using it) per host with requests in flight
+        # or waiting, so that hosts done with are forgotten.
+        self.__hosts = {}
+        self.__idle = {}
+        self.__ssl = None
+
+    async def fetch(self, url):
+        for _ in range(self.max_redirects + 1):
+            response = await self.__fetch_once(url)
+            location = response.headers.get('location')
+            if response.status not in REDIRECTS or not location:
+                return response
+            url = urljoin(url, location)
+        raise FetchError("too many redirects")
+
+    def active_hosts(self):
+        """Number of hosts with requests in flight or waiting."""
+        return len(self.__hosts)
+
+    async def close(self):
+        for connections in self.__idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self.__idle.clear()
+
+    async def __fetch_once(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise FetchError("unsupported url %r" % url)
+        key = host_key(parts)
+        host = self.__hosts.get(key)
+        if host is None:
+            host = self.__hosts[key] = [asyncio.Semaphore(self.per_host), 0]
+        host[1] += 1
+        try:
+            # The host first: waiting for a busy host must not hold one of
+            # the slots requests to other hosts could use.
+            async with host[0], self.__semaphore:
+                return await asyncio.wait_for(self.__request(key, parts, url), self.timeout)
+        finally:
+            host[1] -= 1
+            if not host[1]:
+                del self.__hosts[key]
+
+    async def __connect(self, key):
+        idle = self.__idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not idle:
+                del self.__idle[key]
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+
+        scheme, host, port = key
+        context = None
+        if scheme == 'https':
+            if self.__ssl is None:
+                self.__ssl = ssl.create_default_context()
+            context = self.__ssl
+        reader, writer = await asyncio.open_connection(host, port, ssl=context, limit=READ_SIZE)
+        self.connections_opened += 1
+        return reader, writer, False
+
+    async def __request(self, key, parts, url):
+        reader, writer, reused = await self.__connect(key)
+        try:
+            response, keep_alive = await self.__exchange(reader, writer, parts, url)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            if not reused:
+                raise
+            # The server closed the idle connection, retry on a new one.
+            reader, writer, reused = await self.__connect(key)
+            try:
+                response, keep_alive = await self.__exchange(reader, writer, parts, url)
+            except BaseException:
+                writer.close()
+                raise
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self.__idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+        return response
+
+    async def __exchange(self, reader, writer, parts, url):
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        host = parts.hostname if parts.port is None else '%s:%s' % (parts.hostname, parts.port)
+        writer.write((
+            "GET %s HTTP/1.1\r\n"
+            "Host: %s\r\n"
+            "User-Agent: %s\r\n"
+            "Accept-Encoding: gzip, deflate\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n" % (path, host, self.user_agent)).encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by server")
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        decoder = content_decoder(headers.get('content-encoding'))
+        body = []
+        size = 0
+        async for data in self.__read_body(reader, headers):
+            if decoder is not None:
+                data = decoder.decompress(data)
+            size += len(data)
+            if size > self.max_size:
+                raise FetchError("body larger than %d bytes" % self.max_size)
+            body.append(data)
+        if decoder is not None:
+            body.append(decoder.flush())
+        if 'content-length' not in headers and 'chunked' not in headers.get('transfer-encoding', ''):
+            keep_alive = False
+        return Response(url, int(status), headers, b''.join(body)), keep_alive
+
+    async def __read_body(self, reader, headers):
+        if 'chunked' in headers.get('transfer-encoding', ''):
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining:
+                data = await reader.read(min(remaining, READ_SIZE))
+                if not data:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    return
+                yield data
+
+
+async def extract_urls(
+        urls,
+        fields=("title", "summary"),
+        concurrency=32, per_host=4, extractors=4, queue_size=16,
+        executor=None, fetcher=None, html_partial=False,
+        **document_options):
+    """Fetch `urls` and extract `fields` from them.
+
+    Yields ``(url, PipelineResult)`` pairs as pages are done, in no
+    particular order. Fetch and extraction errors are reported in the
+    result instead of being raised.
+
+    :param concurrency: pages fetched at the same time
+    :param per_host: pages fetched at the same time from one host
+    :param extractors: pages extracted at the same time
+    :param queue_size: fetched pages waiting for extraction before the
+        fetchers are held back
+    :param executor: concurrent.futures executor running the extraction,
+        the loop's default executor if None. Use a ProcessPoolExecutor to
+        extract on several cores.
+    :param fetcher: a Fetcher to use instead of a new one
+    """
+    loop = asyncio.get_running_loop()
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = Fetcher(concurrency, per_host)
+    fetched = asyncio.Queue(queue_size)
+    done = asyncio.Queue()
+
+    # One queue of urls per host. Workers take the next url of a host with
+    # fewer than per_host of its urls being fetched, so that they never
+    # wait for a busy host while others have urls to fetch.
+    todo = {}
+    total = 0
+    for url in urls:
+        todo.setdefault(url_host(url), deque()).append(url)
+        total += 1
+    busy = {}
+    idle_host = asyncio.Event()
+
+    def next_url():
+        for host, queue in todo.items():
+            if busy.get(host, 0) < fetcher.per_host:
+                url = queue.popleft()
+                # Hosts take turns.
+                del todo[host]
+                if queue:
+                    todo[host] = queue
+                busy[host] = busy.get(host, 0) + 1
+                return host, url
+        return None, None
+
+    async def fetch_worker():
+        while todo:
+            host, url = next_url()
+            if url is None:
+                idle_host.clear()
+                await idle_host.wait()
+                continue
+            try:
+                response = await fetcher.fetch(url)
+            except Exception as e:
+                response = None
+                error = "%s: %s" % (type(e).__name__, e)
+            finally:
+                busy[host] -= 1
+                if not busy[host]:
+                    del busy[host]
+                idle_host.set()
+            if response is None:
+                await done.put((url, PipelineResult(None, None, error)))
+            else:
+                await fetched.put((url, response))
+
+    async def extract_worker():
+        while True:
+            url, response = await fetched.get()
+            try:
+                values = await loop.run_in_executor(
+                    executor, extract_response, response, list(fields), html_partial, document_options)
+            except Exception as e:
+                result = PipelineResult(response, None, "%s: %s" % (type(e).__name__, e))
+            else:
+                result = PipelineResult(response, values, None)
+            await done.put((url, result))
+
+    fetchers = [asyncio.ensure_future(fetch_worker()) for _ in range(min(concurrency, total) or 1)]
+    workers = [asyncio.ensure_future(extract_worker()) for _ in range(extractors)]
+    try:
+        for _ in range(total):
+            yield await done.get()
+    finally:
+        for task in fetchers + workers:
+            task.cancel()
+        await asyncio.gather(*(fetchers + workers), return_exceptions=True)
+        if own_fetcher:
+            await fetcher.close()
+
+
+def extract_response(response, fields, html_partial, document_options):
+    if response.status != 200:
+        raise FetchError("HTTP status %d" % response.status)
+    return extract(
+        response.body, fields, html_partial, response.url,
+        http_charset=http_charset(response.headers), **document_options)
@@ -1,23 +1,48 @@
 #!/usr/bin/env python
+import mmap
+import os
 import re
+import time
+from copy import deepcopy
 
+from lxml.etree import Element
 from lxml.etree import tostring
 from lxml.etree import tounicode
+from lxml.html import HtmlElement
 from lxml.html import document_fromstring
 from lxml.html import fragment_fromstring
 
-from .cleaners import clean_attributes
+from .budget import flatten_depth
+from .budget import truncate_nodes
+from .classifier import get_classifier
 from .cleaners import html_cleaner
-from .htmls import build_doc
+from .cleaners import strip_attributes
+from .formats import OUTPUT_FORMATS
+from .formats import render
+from .htmls import buffer_view
+from .htmls import page_encoding
+from .htmls import parse_page
 from .htmls import get_body
-from .htmls import get_title
 from .htmls import shorten_title
 from .htmls import get_first_image_url
-from .htmls import get_image_from_meta
 from .htmls import get_lead
 from .htmls import get_image_in_bad_site
+from .htmls import head_end
+from .htmls import HEAD_MAX_BYTES
+from .metadata import meta_image
+from .metadata import read_metadata
+from .lru import LRUCache
+from .metrics import TextMetrics
+from .stats import NO_STAGE
+from .stats import ParseStats
+from .templates import element_signature
+from .templates import find_signature
+from .trace import Trace
+from .trace import describe
+from .trace import sampled
 
 import logging
+from collections import namedtuple
 from urllib.parse import urlparse
 
 
@@ -75,33 +100,19 @@ def is_empty_node(node):
     return not has_text(node) and not node.getchildren()
 
 
-def describe(node, depth=1):
-    if not hasattr(node, 'tag'):
-        return "[%s]" % type(node)
-    name = node.tag
-    if node.get('id', ''):
-        name += '#' + node.get('id')
-    if node.get('class', ''):
-        name += '.' + node.get('class').replace(' ', '.')
-    if name[:4] in ['div#', 'div.']:
-        name = name[3:]
-    if depth and node.getparent() is not None:
-        return name + ' - ' + describe(node.getparent(), depth - 1)
-    return name
-
-
 def clean(text):
     text = re.sub('\s*\n\s*', '\n', text)
     text = re.sub('[ \t]{2,}', ' ', text)
     return text.strip()
 
 
-def text_length(i):
-    return len(clean(i.text_content() or ""))
-
 regexp_type = type(re.compile('hello, world'))
 
 
+def count_elements(doc):
+    return sum(1 for _ in doc.iter(Element))
+
+
 def compile_pattern(elements, mode=re.U):
     if not elements:
         return None
@@ -112,6 +123,27 @@ def compile_pattern(elements, mode=re.U):
     return re.compile(u'|'.join([re.escape(x.lower()) for x in elements]), mode)
 
 
+# Tags of the paragraphs scored by Document.__score_paragraphs()
+PARAGRAPH_TAGS = ("p", "pre", "td")
+
+# Fields parse() can extract.
+FIELDS = [
+    "title", "short_title", "summary", "content",
+    "lead", "first_image_url", "main_image_url", "metadata"
+]
+# Fields parse() can find in the <head> of the page alone.
+HEAD_FIELDS = ("title", "main_image_url")
+# Fields left out by a head-only parse(), extracted on first access.
+BODY_FIELDS = ["short_title", "summary", "content", "lead", "first_image_url", "metadata"]
+# Fields read from readability.metadata.read_metadata()
+METADATA_FIELDS = ("title", "main_image_url", "metadata")
+
+# Tags looked at by Document.__sanitize()
+SANITIZED_TAGS = (
+    "h1", "h2", "h3", "h4", "h5", "h6", "p", "a", "span", "form", "iframe",
+    "textarea", "button", "strong", "em", "img", "table", "ul", "div")
+
+
 class Document:
     """Class to build a etree document out of html."""
     UNLIKELY_CANDIDATES = [
@@ -152,16 +184,27 @@ class Document:
         'shareLinks': re.compile("twitter.com\/share|pinterest.com\/pin\/create|facebook.com\/sharer", re.I),
         'divToPElementsRe': re.compile('<(a|blockquote|dl|div|img|ol|p|pre|table|ul)', re.I)
     }
+    # tag -> whether divToPElementsRe matches it
+    BLOCK_TAGS = {}
 
     def __init__(
             self,
             input,
             base_url=None, debug=False,
             positive_keywords=None, negative_keywords=None,
-            min_text_length=25, retry_length=250):
+            min_text_length=25, retry_length=250,
+            http_charset=None, stats=False, trace=False,
+            max_bytes=None, max_nodes=None, max_depth=None, deadline=None,
+            templates=None):
         """Generate the document
 
-        :param input: string of the html content.
+        The settings are those of an Extractor, shared with the other
+        documents made with the same arguments. from_extractor() takes an
+        Extractor instead.
+
+        :param input: string of the html content, bytes or another
+            bytes-like object (see from_buffer()), or an lxml.html document
+            already parsed, see from_tree().
         :type input: unicode
         :param base_url: will allow adjusting links to be absolute
         :type base_url: unicode
@@ -175,21 +218,65 @@ class Document:
         :type min_text_length: int
         :param retry_length: acceptable length of the text
         :type retry_length: int
+        :param http_charset: charset from the HTTP Content-Type header
+        :type http_charset: unicode
+        :param stats: record stage timings and counters of parse(), see stats()
+        :type stats: bool
+        :param trace: record the extraction decisions of parse(), see trace().
+            True traces every document, an int N one document in N.
+        :type trace: bool or int
+        :param max_bytes: only parse this many bytes of the input
+            (characters of a str input)
+        :type max_bytes: int
+        :param max_nodes: drop the elements of the parsed page after this many
+        :type max_nodes: int
+        :param max_depth: replace the elements nested deeper than this by
+            their text, at least 1 (<html>)
+        :type max_depth: int
+        :param deadline: seconds after the start of parse() past which the
+            summary extraction skips its remaining stages and returns what
+            it has: the article without the sanitizing or the retry, or the
+            raw body.
+        :type deadline: float
+        :param templates: article containers learned per host, pages of a
+            host whose container is known are only scored around it. Needs
+            base_url.
+        :type templates: readability.templates.TemplateStore
+
+        Limits hit by the last parse() are given by degraded().
 
 
         Also positive_keywords and negative_keywords could be a regexp.
         """
+        extractor = get_extractor(
+            debug=debug, positive_keywords=positive_keywords, negative_keywords=negative_keywords,
+            min_text_length=min_text_length, retry_length=retry_length, stats=stats, trace=trace,
+            max_bytes=max_bytes, max_nodes=max_nodes, max_depth=max_depth, deadline=deadline,
+            templates=templates)
+        self.__setup(extractor, input, base_url, http_charset)
+
+    def __setup(self, extractor, input, base_url, http_charset):
+        self.extractor = extractor
         self.input = input
         self.base_url = base_url
+        self.host = None
         if self.base_url:
             parsed_url = urlparse(self.base_url)
+            self.host = parsed_url.hostname
             self.base_url = "%s://%s" % (parsed_url.scheme, parsed_url.hostname)
-        self.enable_debug = debug
-        self.min_text_length = min_text_length
-        self.retry_length = retry_length
+        self.http_charset = http_charset
+        self.enable_debug = extractor.debug
+        self.min_text_length = extractor.min_text_length
+        self.retry_length = extractor.retry_length
         self.encoding = None
-        self.positive_keywords = compile_pattern(positive_keywords)
-        self.negative_keywords = compile_pattern(negative_keywords)
+        self.max_bytes = extractor.max_bytes
+        self.max_nodes = extractor.max_nodes
+        self.max_depth = extractor.max_depth
+        self.deadline = extractor.deadline
+        self.templates = extractor.templates
+        self.positive_keywords = extractor.positive_keywords
+        self.negative_keywords = extractor.negative_keywords
+        self.classifier = extractor.classifier
 
         # Cache attributes
         self.__orig_html = None
@@ -201,18 +288,219 @@ class Document:
         self.__lead = None
         self.__first_image_url = None
         self.__main_image_url = None
+        self.__metadata = None
+        self.__page_metadata = None
         self.__clean_html = None
-
-    def __parse(self, input):
-        doc, self.encoding = build_doc(input)
-        doc = html_cleaner.clean_html(doc)
-
-        if self.base_url:
-            doc.make_links_absolute(self.base_url, resolve_base_href=True)
+        self.__metrics = None
+        self.__dropped = None
+        # Changes of the ruthless pass, see __undo()
+        self.__journal = None
+        self.__collect_stats = extractor.stats
+        self.__stats = None
+        self.__trace_every = extractor.trace
+        self.__trace = None
+        self.__encoding_source = None
+        self.__output_format = "html"
+        self.__tree_parsed = False
+        self.__truncated_input = False
+        self.__expires = None
+        self.__degraded = []
+        self.__deferred = None
+
+    @classmethod
+    def from_extractor(cls, extractor, input, base_url=None, http_charset=None):
+        """Document of a page with the settings of `extractor`, see
+        Extractor.document()."""
+        document = cls.__new__(cls)
+        document.__setup(extractor, input, base_url, http_charset)
+        return document
+
+    @classmethod
+    def from_tree(cls, doc, encoding=None, encoding_source=None, truncated=False, **kwargs):
+        """Document of a page already parsed with lxml.html, as done by
+        readability.builder.DocumentBuilder.
+
+        parse() cleans and changes the tree in place, so it can only be
+        called once on such a document.
+
+        :param doc: root element of the page
+        :param encoding: encoding the page was decoded with
+        :param encoding_source: where the encoding comes from, see
+            ParseStats
+        :param truncated: the page was cut at max_bytes
+        """
+        document = cls(doc, **kwargs)
+        document.encoding = encoding
+        document.__encoding_source = encoding_source
+        document.__truncated_input = truncated
+        return document
+
+    @classmethod
+    def from_buffer(cls, buffer, **kwargs):
+        """Document of a page held by a bytes-like object: a memoryview, a
+        bytearray, an mmap or a slice of one. The page is not copied, its
+        encoding is detected and it is parsed in place."""
+        return cls(buffer_view(buffer), **kwargs)
+
+    @classmethod
+    def from_path(cls, path, offset=0, length=None, **kwargs):
+        """Document of the page stored in a file, from `offset` and for
+        `length` bytes (to the end of the file by default).
+
+        The page is mapped in memory rather than read: only the parts of
+        it parsing looks at are loaded, and the mapping goes away with the
+        document. A worker can step through a large archive this way.
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if length is None or length > size - offset:
+                length = size - offset
+            if length <= 0:
+                return cls(b'', **kwargs)
+            # mmap offsets are multiples of the allocation granularity.
+            start = offset - offset % mmap.ALLOCATIONGRANULARITY
+            mapped = mmap.mmap(f.fileno(), offset - start + length, offset=start, access=mmap.ACCESS_READ)
+        return cls.from_buffer(memoryview(mapped)[offset - start:], **kwargs)
+
+    def degraded(self):
+        """Names of the limits ("max_bytes", "max_nodes", "max_depth",
+        "deadline") the last parse() ran into, empty if none."""
+        return list(self.__degraded)
+
+    def __degrade(self, limit, **data):
+        if limit in self.__degraded:
+            return
+        self.__degraded.append(limit)
+        if self.__stats is not None:
+            self.__stats.degraded.append(limit)
+        if self.__trace is not None:
+            self.__trace.add('degraded', limit=limit, **data)
+
+    def __expired(self):
+        return self.__expires is not None and time.monotonic() > self.__expires
+
+    def stats(self):
+        """ParseStats of the last parse() call, None unless the document
+        was created with stats=True."""
+        return self.__stats
+
+    def trace(self):
+        """Events of the last parse() call as a list of dicts (see
+        readability.trace.Trace), None if it was not traced."""
+        if self.__trace is None:
+            return None
+        return self.__trace.events
+
+    def __stage(self, name):
+        if self.__stats is None:
+            return NO_STAGE
+        return self.__stats.stage(name)
+
+    def __parse(self, input, fields, detected=None):
+        stats = self.__stats
+        if isinstance(input, HtmlElement):
+            if self.__tree_parsed:
+                raise ValueError("a Document of an lxml tree can only be parsed once")
+            self.__tree_parsed = True
+            doc = input
+            source = self.__encoding_source
+            if self.__truncated_input:
+                self.__degrade('max_bytes')
         else:
-            doc.resolve_base_href()
+            if not isinstance(input, (str, bytes)):
+                input = buffer_view(input)
+            if detected is None:
+                with self.__stage('encoding'):
+                    detected = page_encoding(input, self.http_charset, self.host)
+            self.encoding, source = detected
+            if self.max_bytes is not None and len(input) > self.max_bytes:
+                # Cut after the encoding detection, which could fail on a
+                # partial character.
+                self.__degrade('max_bytes', length=len(input))
+                input = input[:self.max_bytes]
+            with self.__stage('build_doc'):
+                doc = parse_page(input, self.encoding)
+        if stats is not None:
+            stats.encoding = self.encoding
+            stats.encoding_source = source
+            stats.nodes_before_cleaning = count_elements(doc)
+        if self.max_nodes is not None:
+            with self.__stage('limits'):
+                if truncate_nodes(doc, self.max_nodes):
+                    self.__degrade('max_nodes')
+        self.__page_metadata = None
+        if any(field in fields for field in METADATA_FIELDS):
+            # Before the Cleaner, which drops the JSON-LD scripts and the
+            # canonical <link>.
+            with self.__stage('metadata'):
+                self.__page_metadata = read_metadata(doc, json_ld="metadata" in fields)
+        with self.__stage('cleaner'):
+            # Clean in place, clean_html() would deepcopy the tree first.
+            html_cleaner(doc)
+        if stats is not None:
+            stats.nodes_after_cleaning = count_elements(doc)
+        if self.max_depth is not None:
+            # After the Cleaner, so that no script or style text is kept.
+            with self.__stage('limits'):
+                if flatten_depth(doc, self.max_depth):
+                    self.__degrade('max_depth')
+
+        with self.__stage('links'):
+            if self.base_url:
+                doc.make_links_absolute(self.base_url, resolve_base_href=True)
+            else:
+                doc.resolve_base_href()
         return doc
 
+    def __parse_head(self, params_list, html_partial, output_format):
+        """Find the `params_list` fields in the <head> of the page only,
+        parsed up to its </head> and not cleaned.
+
+        The head is not enough when a field needs the body, when </head> is
+        not in the first HEAD_MAX_BYTES or when the head has no title or no
+        meta image. The rest of the page is then left for __parse(), and
+        self.__deferred stays None. Returns the ``(encoding, source)`` of
+        the page if it was detected, for __parse() to reuse.
+        """
+        input = self.input
+        if (not params_list or not set(params_list) <= set(HEAD_FIELDS) or
+                isinstance(input, HtmlElement)):
+            return None
+        if not isinstance(input, (str, bytes)):
+            input = buffer_view(input)
+        with self.__stage('encoding'):
+            detected = page_encoding(input, self.http_charset, self.host)
+        limit = HEAD_MAX_BYTES
+        if self.max_bytes is not None:
+            limit = min(limit, self.max_bytes)
+        end = head_end(input, limit)
+        if end is None:
+            return detected
+        with self.__stage('build_doc'):
+            head = parse_page(input[:end], detected[0])
+        with self.__stage('metadata'):
+            metadata = read_metadata(head, json_ld=False)
+        if "title" in params_list and metadata["title"] is None:
+            return detected
+        if "main_image_url" in params_list and not meta_image(metadata):
+            return detected
+        self.encoding = detected[0]
+        if "title" in params_list:
+            self.__title = metadata["title"]
+        if "main_image_url" in params_list:
+            self.__main_image_url = meta_image(metadata)
+        self.__deferred = (html_partial, output_format)
+        if self.__stats is not None:
+            self.__stats.encoding, self.__stats.encoding_source = detected
+            self.__stats.head_only = True
+        return detected
+
+    def __parse_deferred(self):
+        """Extract the body fields left out by a head-only parse()."""
+        if self.__deferred is not None:
+            html_partial, output_format = self.__deferred
+            self.parse(BODY_FIELDS, html_partial, output_format)
+
     def __detect_req(self, params_list, match, req):
         if match in params_list and req not in params_list:
             params_list.append(req)
@@ -220,57 +508,117 @@ class Document:
     def parse(
             self,
             params_list=["title", "summary", "content", "lead", "first_image_url", "main_image_url"],
-            html_partial=False):
+            html_partial=False, output_format="html"):
+        """Extract the `params_list` fields of the page.
+
+        :param html_partial: return the summary as a div, without html and
+            body tags
+        :param output_format: format of the summary, one of "html", "text",
+            "markdown", "blocks" or "element", see readability.formats
+
+        When only HEAD_FIELDS are asked for, only the <head> of the page is
+        parsed, if they are all found there. The other fields are then
+        extracted when one of them is first read.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("unknown output format %r, expected one of %s" % (
+                output_format, ", ".join(OUTPUT_FORMATS)))
+        self.__output_format = output_format
         # Detect params
         full_params_list = list(params_list)
         self.__detect_req(full_params_list, "lead", "summary")
         self.__detect_req(full_params_list, "main_image_url", "summary")
         self.__detect_req(full_params_list, "first_image_url", "summary")
 
-        # Pre parsing
-        self.__orig_html = self.__parse(self.input)
-        self.__cut_html = self.__parse(self.input)
-
-        if "content" in full_params_list:
-            self.__content = get_body(self.__parse(self.input))
+        # Pre parsing: the input is parsed and cleaned only once. Title, meta
+        # image and content extractors only read this tree, the summary pass
+        # is destructive and gets a copy only when the tree is read again
+        # after it (content and the "bad site" image fallback).
+        if self.__collect_stats:
+            self.__stats = ParseStats()
+        self.__trace = None
+        if self.enable_debug or sampled(self.__trace_every):
+            self.__trace = Trace(log=self.enable_debug)
+        self.__degraded = []
+        self.__expires = None
+        if self.deadline is not None:
+            self.__expires = time.monotonic() + self.deadline
+        self.__deferred = None
+        detected = self.__parse_head(params_list, html_partial, output_format)
+        if self.__deferred is not None:
+            return
+        self.__orig_html = self.__parse(self.input, full_params_list, detected)
+        self.__cut_html = self.__orig_html
+
+        if "metadata" in full_params_list:
+            self.__metadata = self.__page_metadata
         if "title" in full_params_list:
-            self.__title = get_title(self.__orig_html)
+            self.__title = self.__page_metadata["title"] or ''
         if "short_title" in full_params_list:
-            self.__short_title = shorten_title(self.__orig_html)
+            with self.__stage('short_title'):
+                self.__short_title = shorten_title(self.__orig_html)
+        image = None
+        if "main_image_url" in full_params_list:
+            image = meta_image(self.__page_metadata)
         if "summary" in full_params_list:
+            if "content" in full_params_list or ("main_image_url" in full_params_list and not image):
+                with self.__stage('copy'):
+                    self.__cut_html = deepcopy(self.__orig_html)
             self.__summary = self.__get_summary(html_partial)
         if "lead" in full_params_list:
-            self.__lead = get_lead(self.__cut_html)
+            with self.__stage('lead'):
+                self.__lead = get_lead(self.__cut_html)
         if "first_image_url" in full_params_list:
-            self.__first_image_url = get_first_image_url(self.__cut_html)
-        if "main_image_url" in full_params_list:
-            if not self.__first_image_url:
+            with self.__stage('images'):
                 self.__first_image_url = get_first_image_url(self.__cut_html)
-            meta_image = get_image_from_meta(self.__orig_html)
-            self.__main_image_url = meta_image or self.__first_image_url
-            if not self.__main_image_url:
-                self.debug("Not found easy image, use BAD function.")
-                self.__main_image_url = get_image_in_bad_site(self.__orig_html)
+        if "main_image_url" in full_params_list:
+            with self.__stage('images'):
+                if not self.__first_image_url:
+                    self.__first_image_url = get_first_image_url(self.__cut_html)
+                self.__main_image_url = image or self.__first_image_url
+                if not self.__main_image_url:
+                    self.debug("Not found easy image, use BAD function.")
+                    self.__main_image_url = get_image_in_bad_site(self.__orig_html)
+        # get_body() drops nodes, so it goes last.
+        if "content" in full_params_list:
+            with self.__stage('content'):
+                self.__content = get_body(self.__orig_html)
 
     def content(self):
+        if self.__content is None:
+            self.__parse_deferred()
         return self.__content
 
     def title(self):
         return self.__title
 
     def short_title(self):
+        if self.__short_title is None:
+            self.__parse_deferred()
         return self.__short_title
 
     def first_image_url(self):
+        if self.__first_image_url is None:
+            self.__parse_deferred()
         return self.__first_image_url
 
     def main_image_url(self):
         return self.__main_image_url
 
+    def metadata(self):
+        """Dict of the page metadata, see readability.metadata."""
+        if self.__metadata is None:
+            self.__parse_deferred()
+        return self.__metadata
+
     def lead(self):
+        if self.__lead is None:
+            self.__parse_deferred()
         return self.__lead
 
     def summary(self):
+        if self.__summary is None:
+            self.__parse_deferred()
         return self.__summary
 
     def __get_summary(self, html_partial=False):
@@ -282,51 +630,217 @@ class Document:
         """
         try:
             ruthless = True
-            while True:
+            stats = self.__stats
+            with self.__stage('prepare'):
                 for i in self.__tags(self.__cut_html, 'script', 'style'):
                     i.drop_tree()
                 for i in self.__tags(self.__cut_html, 'body'):
                     i.set('id', 'readabilityBody')
+            self.__metrics = None
+            known_metrics = None
+            learn = self.templates is not None and self.host is not None
+            # Signature of the best candidate of the first pass, and whether
+            # it was the learned one.
+            signature = None
+            used_template = False
+            while True:
+                if self.__expired():
+                    # No time left to look for candidates.
+                    self.__degrade('deadline', stage="score")
+                    return self.__unsanitized(self.__body_or_root())
                 if ruthless:
-                    self.__remove_unlikely_candidates()
-                self.__transform_misused_divs_into_paragraphs()
-                candidates = self.__score_paragraphs()
-
-                best_candidate = self.__select_best_candidate(candidates)
+                    # The changes of the ruthless pass are recorded, for the
+                    # lenient pass to start over from the tree as it is now.
+                    self.__journal = []
+                    root = self.__cut_html
+                    with self.__stage('remove_unlikely_candidates'):
+                        self.__remove_unlikely_candidates()
+                with self.__stage('transform_divs'):
+                    self.__transform_misused_divs_into_paragraphs()
+                learned = None
+                if ruthless and learn:
+                    with self.__stage('template'):
+                        learned = self.__learned_candidates()
+                if learned is not None:
+                    candidates, best_candidate = learned
+                    used_template = True
+                else:
+                    with self.__stage('metrics'):
+                        self.__metrics = TextMetrics(self.__cut_html, known_metrics)
+                    with self.__stage('score_paragraphs'):
+                        candidates = self.__score_paragraphs(
+                            self.__tags(self.__cut_html, *PARAGRAPH_TAGS))
+
+                    with self.__stage('select_candidate'):
+                        best_candidate = self.__select_best_candidate(candidates)
+                    if ruthless and learn and best_candidate:
+                        signature = element_signature(best_candidate['elem'])
+                if stats is not None:
+                    stats.candidates = len(candidates)
 
                 if best_candidate:
-                    article = self.__get_article(
-                            candidates,
-                            best_candidate,
-                            html_partial=html_partial)
+                    with self.__stage('get_article'):
+                        article = self.__get_article(
+                                candidates,
+                                best_candidate,
+                                html_partial=html_partial)
                 else:
-                    if ruthless:
-                        self.debug("ruthless removal did not work. ")
+                    if ruthless and not self.__expired():
                         ruthless = False
-                        self.debug(
-                            ("ended up stripping too much - "
-                             "going for a safer _parse"))
+                        if stats is not None:
+                            stats.ruthless_retry = True
+                        if self.__trace is not None:
+                            self.__trace.add('retry', reason="no candidate")
+                        known_metrics = self.__restore(root)
                         # try again
                         continue
                     else:
-                        self.debug(
-                            ("Ruthless and lenient parsing did not work. "
-                             "Returning raw html"))
-                        article = self.__cut_html.find('body')
-                        if article is None:
-                            article = self.__cut_html
-                cleaned_article = self.__sanitize(article, candidates)
-                article_length = len(cleaned_article or '')
-                of_acceptable_length = article_length >= self.retry_length
-                if ruthless and not of_acceptable_length:
+                        if ruthless:
+                            self.__degrade('deadline', stage="retry")
+                        if stats is not None:
+                            stats.raw_body_fallback = True
+                        if self.__trace is not None:
+                            self.__trace.add('raw_body')
+                        article = self.__body_or_root()
+                if self.__expired():
+                    self.__degrade('deadline', stage="sanitize")
+                    return self.__unsanitized(article)
+                with self.__stage('sanitize'):
+                    self.__sanitize(article, candidates)
+                cleaned_article = None
+                if ruthless:
+                    with self.__stage('serialize'):
+                        if self.__output_format == "html":
+                            cleaned_article = self.__get_clean_html()
+                            article_length = len(cleaned_article)
+                        else:
+                            article_length = self.__html_length(self.retry_length)
+                if ruthless and article_length < self.retry_length:
+                    if self.__expired():
+                        self.__degrade('deadline', stage="retry")
+                        return self.__output(cleaned_article)
                     ruthless = False
+                    if stats is not None:
+                        stats.ruthless_retry = True
+                    if self.__trace is not None:
+                        self.__trace.add('retry', reason="article too short", length=article_length)
+                    known_metrics = self.__restore(root)
                     # Loop through and try again.
                     continue
                 else:
-                    return cleaned_article
+                    if learn:
+                        if used_template and ruthless:
+                            self.templates.hit(self.host)
+                        else:
+                            if used_template:
+                                self.templates.miss(self.host)
+                            self.templates.observe(self.host, signature if ruthless else None)
+                    return self.__output(cleaned_article)
         except Exception as e:
             logging.exception('error getting summary: ')
             raise Unparseable(str(e))
+        finally:
+            self.__journal = None
+
+    def __body_or_root(self):
+        body = self.__cut_html.find('body')
+        if body is None:
+            return self.__cut_html
+        return body
+
+    def __unsanitized(self, article):
+        """Summary of `article` as it is, for when there is no time left to
+        sanitize it"""
+        with self.__stage('strip_attributes'):
+            strip_attributes(article)
+        self.__cut_html = article
+        return self.__output()
+
+    def __output(self, html=None):
+        """The article in the output format of parse(), `html` being its
+        html when already serialized."""
+        if html is not None:
+            return html
+        with self.__stage('serialize'):
+            return render(self.__cut_html, self.__output_format)
+
+    def __html_length(self, at_least):
+        """Length of the html of the article, or of its text when that is
+        already `at_least`: the text is part of the html and cheaper to
+        serialize."""
+        length = len(tostring(self.__cut_html, method='text', encoding=str))
+        if length < at_least:
+            length = len(self.__get_clean_html())
+        return length
+
+    def __restore(self, root):
+        """Go back to `root` as it was before the ruthless pass, return the
+        measurements still valid on it"""
+        with self.__stage('restore'):
+            journal, self.__journal = self.__journal, None
+            changed = self.__undo(journal)
+            known = self.__metrics.save()
+            for elem in changed:
+                known.pop(elem, None)
+            self.__cut_html = root
+            self.__metrics = None
+            return known
+
+    def __undo(self, journal):
+        """Undo the changes of `journal`, last first. Returns the elements
+        whose text they changed, with their ancestors.
+
+        A change is a tuple of its kind, the node and what it was:
+        ('drop', node, parent, previous, tail) for __drop_node_and_empty_parents(),
+        ('move', node, parent, previous) for a node moved or removed with
+        its tail, ('insert', node), ('tag', node, tag), ('text', node, text),
+        ('tail', node, tail) and ('attrib', node, attribute items).
+        """
+        touched = []
+        for change in reversed(journal):
+            kind, node = change[0], change[1]
+            if kind == 'attrib':
+                node.attrib.clear()
+                node.attrib.update(change[2])
+            elif kind == 'insert':
+                parent = node.getparent()
+                parent.remove(node)
+                touched.append(parent)
+            elif kind == 'tag':
+                node.tag = change[2]
+                touched.append(node)
+            elif kind == 'text':
+                node.text = change[2]
+                touched.append(node)
+            elif kind == 'tail':
+                node.tail = change[2]
+                touched.append(node.getparent())
+            else:
+                parent, previous = change[2], change[3]
+                tail = change[4] if kind == 'drop' else None
+                if tail:
+                    # drop_tree() joined the tail to the text before the node.
+                    if previous is None:
+                        parent.text = parent.text[:-len(tail)] or None
+                    else:
+                        previous.tail = previous.tail[:-len(tail)] or None
+                if previous is None:
+                    parent.insert(0, node)
+                else:
+                    previous.addnext(node)
+                touched.append(parent)
+
+        changed = set()
+        for elem in touched:
+            while elem is not None and elem not in changed:
+                changed.add(elem)
+                elem = elem.getparent()
+        return changed
+
+    def __moving(self, node):
+        """Record where `node` is before it is moved or removed"""
+        if self.__journal is not None:
+            self.__journal.append(('move', node, node.getparent(), node.getprevious()))
 
     def __get_article(self, candidates, best_candidate, html_partial=False):
         # Now that we have the top candidate, look through its siblings for
@@ -361,6 +875,7 @@ class Document:
                     append = True
 
             if append:
+                self.__moving(sibling)
                 # We don't want to append directly to output, but the div
                 # in html->body->div
                 if html_partial:
@@ -373,37 +888,99 @@ class Document:
 
     def __select_best_candidate(self, candidates):
         sorted_candidates = sorted(list(candidates.values()), key=lambda x: x['content_score'], reverse=True)
-        for candidate in sorted_candidates[:5]:
-            elem = candidate['elem']
-            self.debug("Top 5 : %6.3f %s" % (
-                candidate['content_score'],
-                describe(elem)))
-
         if len(sorted_candidates) == 0:
             return None
 
         best_candidate = sorted_candidates[0]
+        if self.__trace is not None:
+            self.__trace.add(
+                'best', best_candidate['elem'], score=best_candidate['content_score'],
+                runners_up=[(describe(c['elem']), c['content_score']) for c in sorted_candidates[1:5]])
         return best_candidate
 
-    def __get_link_density(self, elem):
-        link_length = 0
-        for i in elem.findall(".//a"):
-            link_length += text_length(i)
+    def __learned_candidates(self):
+        """Candidates around the container learned for the host, and the
+        container as the best one. None if it is not found or fails the
+        checks of the TemplateStore."""
+        signature = self.templates.lookup(self.host)
+        if signature is None:
+            return None
+        elem = find_signature(self.__cut_html, signature)
+        best_candidate = None
+        if elem is not None and elem.getparent() is not None:
+            scope = elem.getparent()
+            self.__metrics = TextMetrics(elem)
+            candidates = self.__score_paragraphs(self.__nearby_paragraphs(scope, elem))
+            best_candidate = candidates.get(elem)
+        if best_candidate is not None:
+            # The elements whose scores are complete: the parent, the
+            # siblings and the elements below the container.
+            rivals = [scope]
+            rivals.extend(scope.iterchildren(Element))
+            rivals.extend(elem.iterdescendants(Element))
+            score = best_candidate['content_score']
+            if any(node in candidates and candidates[node]['content_score'] > score for node in rivals):
+                best_candidate = None
+        if (best_candidate is None
+                or self.__metrics.text_length(elem) < self.retry_length
+                or self.__get_link_density(elem) > self.templates.max_link_density):
+            self.templates.miss(self.host)
+            self.__metrics = None
+            if self.__stats is not None:
+                self.__stats.template = "failed"
+            if self.__trace is not None:
+                self.__trace.add('template', elem, used=False)
+            return None
 
-        total_length = text_length(elem)
-        return float(link_length) / max(total_length, 1)
+        # Siblings kept by __get_article() for their score are sanitized
+        # with it, which needs the scores of the elements below them.
+        threshold = max([10, best_candidate['content_score'] * 0.2])
+        for sibling in scope.iterchildren(Element):
+            if sibling is not elem and sibling in candidates and \
+                    candidates[sibling]['content_score'] >= threshold:
+                below = self.__score_paragraphs(self.__tags(sibling, "p", "pre", "td"))
+                for node in sibling.iterdescendants(Element):
+                    if node in below:
+                        candidates[node] = below[node]
+
+        if self.__stats is not None:
+            self.__stats.template = "used"
+        if self.__trace is not None:
+            self.__trace.add('template', elem, used=True, score=best_candidate['content_score'])
+        return candidates, best_candidate
+
+    def __nearby_paragraphs(self, scope, elem):
+        """The paragraphs giving their score to `scope`, to `elem` and the
+        elements below it, and to the siblings of `elem`: those below
+        `elem` and those at most three levels below `scope`. They come
+        in the order the full scoring takes them, tag after tag."""
+        paragraphs = []
+
+        def add(node, depth):
+            for child in node.iterchildren(Element):
+                if child.tag in PARAGRAPH_TAGS:
+                    paragraphs.append(child)
+                if child is elem:
+                    paragraphs.extend(elem.iterdescendants(*PARAGRAPH_TAGS))
+                elif depth < 3:
+                    add(child, depth + 1)
+        add(scope, 1)
+        paragraphs.sort(key=lambda node: PARAGRAPH_TAGS.index(node.tag))
+        return paragraphs
 
-    def __score_paragraphs(self, ):
+    def __get_link_density(self, elem):
+        return self.__metrics.link_density(elem)
+
+    def __score_paragraphs(self, paragraphs):
         candidates = {}
         ordered = []
-        for elem in self.__tags(self.__cut_html, "p", "pre", "td"):
+        for elem in paragraphs:
             parent_node = elem.getparent()
             if parent_node is None:
                 continue
             grand_parent_node = parent_node.getparent()
 
-            inner_text = clean(elem.text_content() or "")
-            inner_text_len = len(inner_text)
+            inner_text_len = self.__metrics.text_length(elem)
 
             # If this paragraph is less than 25 characters
             # don't even count it.
@@ -420,7 +997,7 @@ class Document:
                 ordered.append(grand_parent_node)
 
             content_score = 1
-            content_score += len(inner_text.split(','))
+            content_score += self.__metrics.comma_count(elem) + 1
             content_score += min((inner_text_len / 100), 3)
 
             candidates[parent_node]['content_score'] += content_score
@@ -433,12 +1010,9 @@ class Document:
         for elem in ordered:
             candidate = candidates[elem]
             ld = self.__get_link_density(elem)
-            score = candidate['content_score']
-            self.debug("Candidate: %6.3f %s link density %.3f -> %6.3f" % (
-                score,
-                describe(elem),
-                ld,
-                score * (1 - ld)))
+            if self.__trace is not None:
+                score = candidate['content_score']
+                self.__trace.add('candidate', elem, score=score, link_density=ld, final=score * (1 - ld))
             candidate['content_score'] *= (1 - ld)
 
         return candidates
@@ -447,23 +1021,10 @@ class Document:
         weight = 0
         for feature in [e.get('class', None), e.get('id', None)]:
             if feature:
-                if self.REGEXES['negativeRe'].search(feature):
-                    weight -= 25
-
-                if self.REGEXES['positiveRe'].search(feature):
-                    weight += 25
-
-                if self.positive_keywords and self.positive_keywords.search(feature):
-                    weight += 25
-
-                if self.negative_keywords and self.negative_keywords.search(feature):
-                    weight -= 25
-
-        if self.positive_keywords and self.positive_keywords.match('tag-'+e.tag):
-            weight += 25
+                weight += self.classifier.weight(feature)
 
-        if self.negative_keywords and self.negative_keywords.match('tag-'+e.tag):
-            weight -= 25
+        if self.positive_keywords or self.negative_keywords:
+            weight += self.classifier.tag_weight(e.tag)
 
         return weight
 
@@ -493,32 +1054,38 @@ class Document:
             if len(s) < 2:
                 continue
             # self.debug(s)
-            if (
-                self.REGEXES['unlikelyCandidatesRe'].search(s) and
-                (not self.REGEXES['okMaybeItsACandidateRe'].search(s)) and
-                elem.tag not in ['html', 'body']
-            ):
-                self.debug("Removing unlikely candidate - %s" % describe(elem))
+            if self.classifier.is_unlikely(s) and elem.tag not in ['html', 'body']:
+                if self.__trace is not None:
+                    self.__trace.add('removed', elem, reason="unlikely candidate")
                 self.__drop_node_and_empty_parents(elem)
 
     def __transform_misused_divs_into_paragraphs(self):
+        # transform <div>s that do not contain other block elements into
+        # <p>s. Every block element marks its ancestors as containing one,
+        # stopping at the first ancestor already marked, so the whole tree
+        # is checked in a single pass, all descendants included.
+        has_block = set()
+        for elem in self.__cut_html.iter(Element):
+            if self.__is_block_tag(elem.tag):
+                parent = elem.getparent()
+                while parent is not None and parent not in has_block:
+                    has_block.add(parent)
+                    parent = parent.getparent()
+
         for elem in self.__tags(self.__cut_html, 'div'):
-            # transform <div>s that do not contain other block elements into
-            # <p>s
-            # FIXME: The current implementation ignores all descendants that
-            # are not direct children of elem
-            # This results in incorrect results in case there is an <img>
-            # buried within an <a> for example
-            if not self.REGEXES['divToPElementsRe'].search(
-                    str(b''.join(map(tostring, list(elem))))):
+            if elem not in has_block:
                 # self.debug("Altering %s to p" % (describe(elem)))
-                elem.tag = "p"
+                self.__retag(elem, "p")
                 # print "Fixed element "+describe(elem)
 
+        journal = self.__journal
         for elem in self.__tags(self.__cut_html, 'div'):
             if elem.text and elem.text.strip():
                 p = fragment_fromstring('<p/>')
                 p.text = elem.text
+                if journal is not None:
+                    journal.append(('text', elem, elem.text))
+                    journal.append(('insert', p))
                 elem.text = None
                 elem.insert(0, p)
                 # print "Appended "+tounicode(p)+" to "+describe(elem)
@@ -527,6 +1094,9 @@ class Document:
                 if child.tail and child.tail.strip():
                     p = fragment_fromstring('<p/>')
                     p.text = child.tail
+                    if journal is not None:
+                        journal.append(('tail', child, child.tail))
+                        journal.append(('insert', p))
                     child.tail = None
                     elem.insert(pos + 1, p)
                     # print "Inserted "+tounicode(p)+" to "+describe(elem)
@@ -534,23 +1104,47 @@ class Document:
                     # print 'Dropped <br> at '+describe(elem)
                     self.__drop_node_and_empty_parents(child)
 
+    def __retag(self, elem, tag):
+        if self.__journal is not None:
+            self.__journal.append(('tag', elem, elem.tag))
+        elem.tag = tag
+
+    def __is_block_tag(self, tag):
+        # divToPElementsRe used to be searched in the serialized children,
+        # so it matches on the start of the tag name.
+        try:
+            return self.BLOCK_TAGS[tag]
+        except KeyError:
+            is_block = bool(self.REGEXES['divToPElementsRe'].match('<' + tag))
+            if len(self.BLOCK_TAGS) < 1024:
+                self.BLOCK_TAGS[tag] = is_block
+            return is_block
+
     def __tags(self, node, *tag_names):
         for tag_name in tag_names:
             for e in node.findall('.//%s' % tag_name):
                 yield e
 
-    def __reverse_tags(self, node, *tag_names):
-        for tag_name in tag_names:
-            for e in reversed(node.findall('.//%s' % tag_name)):
-                yield e
-
     def __get_clean_html(self):
-        return clean_attributes(tounicode(self.__cut_html))
+        return tounicode(self.__cut_html)
 
     def __normalize_images_path(self, image):
+        if self.__journal is not None:
+            self.__journal.append(('attrib', image, image.attrib.items()))
         if not image.attrib["src"].startswith(("//", "https://", "http://")):
             image.attrib["src"] = "%s%s" % (self.base_url, image.attrib["src"])
 
+    def __indexed_tags(self, index, *tag_names, reverse=False):
+        """Like __tags() (in reverse order with `reverse`) on the node
+        `index` was built on, see __sanitize()"""
+        for tag_name in tag_names:
+            dropped = self.__dropped
+            elems = [e for e in index.get(tag_name, ()) if e not in dropped]
+            if reverse:
+                elems.reverse()
+            for e in elems:
+                yield e
+
     def __drop_node_and_empty_parents(self, node):
         """
         Removes given element and hierarchy if everything is empty
@@ -558,6 +1152,12 @@ class Document:
         while True:
             parent = node.getparent()
             if parent is not None:
+                if self.__metrics is not None:
+                    self.__metrics.invalidate(parent)
+                if self.__dropped is not None:
+                    self.__dropped.update(node.iter(Element))
+                if self.__journal is not None:
+                    self.__journal.append(('drop', node, parent, node.getprevious(), node.tail))
                 node.drop_tree()
                 if is_empty_node(parent):
                     node = parent
@@ -568,20 +1168,22 @@ class Document:
         while True:
             if len(node) == 1 and node[0].tag == "div":
                 node_for_remove = node[0]
-                for i, elem in enumerate(node_for_remove):
-                    node.insert(i, elem)
+                for elem in list(node_for_remove):
+                    self.__moving(elem)
+                    node_for_remove.addprevious(elem)
+                self.__moving(node_for_remove)
                 node.remove(node_for_remove)
                 continue
             break
 
-        while True:
-            for i, elem in enumerate(node):
-                if elem.tag == "div":
-                    if len(elem) == 1:
-                        node.insert(i, elem[0])
-                        break
-            else:
-                break
+        # Unwrap the single children of divs, and theirs in turn, in one
+        # pass: moving a child out only changes its former parent.
+        for elem in list(node):
+            while elem.tag == "div" and len(elem) == 1:
+                child = elem[0]
+                self.__moving(child)
+                elem.addprevious(child)
+                elem = child
 
     def __drop_empty_elements(self, node):
         for elem in self.__tags(node, "div"):
@@ -591,35 +1193,69 @@ class Document:
                 self.__drop_node_and_empty_parents(elem)
 
     def __sanitize(self, node, candidates):
-        for header in self.__tags(node, "h1", "h2", "h3", "h4", "h5", "h6", "p"):
+        # The elements of every tag handled below are found in one walk.
+        # The passes still run one after the other, each one seeing what the
+        # previous ones removed: a pass over a tag starts with the elements
+        # of the index not dropped yet, which is what findall() would give.
+        index = {}
+        for elem in node.iterdescendants(*SANITIZED_TAGS):
+            index.setdefault(elem.tag, []).append(elem)
+        self.__dropped = set()
+        try:
+            self.__sanitize_tags(node, index, candidates)
+        finally:
+            self.__dropped = None
+
+        root = node.find(".//body")
+        if root is None:
+            root = node
+        self.__move_childrens_to_root(root)
+        self.__drop_empty_elements(root)
+        with self.__stage('strip_attributes'):
+            if self.__journal is None:
+                strip_attributes(node)
+            else:
+                changed = []
+                strip_attributes(node, changed)
+                self.__journal.extend(('attrib', elem, items) for elem, items in changed)
+
+        self.__cut_html = node
+
+    def __sanitize_tags(self, node, index, candidates):
+        for header in self.__indexed_tags(index, "h1", "h2", "h3", "h4", "h5", "h6", "p"):
             if self.__class_weight(header) < 0 or self.__get_link_density(header) > 0.33:
                 self.__drop_node_and_empty_parents(header)
 
         # removes empty paragraphs and removes unwanted lead spaces
-        for elem in self.__tags(node, "p"):
+        for elem in self.__indexed_tags(index, "p"):
             if elem.text:
-                elem.text = elem.text.lstrip()
+                text = elem.text.lstrip()
+                if text != elem.text:
+                    if self.__journal is not None:
+                        self.__journal.append(('text', elem, elem.text))
+                    elem.text = text
+                    self.__metrics.invalidate(elem)
             if is_empty_node(elem):
                 self.__drop_node_and_empty_parents(elem)
 
-        for elem in self.__tags(node, "a"):
+        for elem in self.__indexed_tags(index, "a"):
             if "href" in elem.attrib and self.REGEXES['shareLinks'].search(elem.attrib["href"]) or is_empty_node(elem):
                 self.__drop_node_and_empty_parents(elem)
 
-        for elem in self.__tags(node, "span"):
+        for elem in self.__indexed_tags(index, "span"):
             if is_empty_node(elem):
                 self.__drop_node_and_empty_parents(elem)
 
-        for elem in self.__tags(node, "form", "iframe", "textarea", "button"):
+        for elem in self.__indexed_tags(index, "form", "iframe", "textarea", "button"):
             self.__drop_node_and_empty_parents(elem)
 
-        for elem in self.__tags(node, "strong"):
-            elem.tag = "b"
+        for elem in self.__indexed_tags(index, "strong"):
+            self.__retag(elem, "b")
 
-        for elem in self.__tags(node, "em"):
-            elem.tag = "i"
+        for elem in self.__indexed_tags(index, "em"):
+            self.__retag(elem, "i")
 
-        for elem in self.__tags(node, "img"):
+        for elem in self.__indexed_tags(index, "img"):
             for attr in ["width", "height"]:
                 try:
                     if attr in elem.attrib and int(elem.attrib[attr]) < 70:
@@ -635,7 +1271,7 @@ class Document:
 
         allowed = {}
         # Conditionally clean <table>s, <ul>s, and <div>s
-        for el in self.__reverse_tags(node, "table", "ul", "div"):
+        for el in self.__indexed_tags(index, "table", "ul", "div", reverse=True):
             if el in allowed:
                 continue
             weight = self.__class_weight(el)
@@ -647,16 +1283,15 @@ class Document:
             tag = el.tag
 
             if weight + content_score < 0:
-                self.debug("Cleaned %s with score %6.3f and weight %-3s" % (describe(el), content_score, weight))
+                if self.__trace is not None:
+                    self.__trace.add('removed', el, reason="negative score", score=content_score, weight=weight)
                 self.__drop_node_and_empty_parents(el)
-            elif el.text_content().count(",") < 10:
-                counts = {}
-                for kind in ['p', 'img', 'li', 'a', 'embed', 'input']:
-                    counts[kind] = len(el.findall('.//%s' % kind))
+            elif self.__metrics.comma_count(el) < 10:
+                counts = self.__metrics.tag_counts(el)
                 counts["li"] -= 100
 
                 # Count the text length excluding any surrounding whitespace
-                content_length = text_length(el)
+                content_length = self.__metrics.text_length(el)
                 link_density = self.__get_link_density(el)
                 parent_node = el.getparent()
                 if parent_node is not None:
@@ -670,7 +1305,7 @@ class Document:
                 # if el.tag == 'div' and counts["img"] >= 1:
                 #    continue
                 if counts["p"] and counts["img"] > counts["p"]:
-                    reason = "too many images (%s)" % counts["img"]
+                    reason = "too many images"
                     to_remove = True
                 elif counts["li"] > counts["p"] and tag != "ul" and tag != "ol":
                     reason = "more <li>s than <p>s"
@@ -679,15 +1314,13 @@ class Document:
                     reason = "less than 3x <p>s than <input>s"
                     to_remove = True
                 elif content_length < (self.min_text_length) and (counts["img"] == 0 or counts["img"] > 2):
-                    reason = "too short content length %s without a single image" % content_length
+                    reason = "too short content without a single image"
                     to_remove = True
                 elif weight < 25 and link_density > 0.2:
-                        reason = "too many links %.3f for its weight %s" % (
-                            link_density, weight)
+                        reason = "too many links for its weight"
                         to_remove = True
                 elif weight >= 25 and link_density > 0.5:
-                    reason = "too many links %.3f for its weight %s" % (
-                        link_density, weight)
+                    reason = "too many links for its weight"
                     to_remove = True
                 elif (counts["embed"] == 1 and content_length < 75) or counts["embed"] > 1:
                     reason = "<embed>s with too short content length, or too many <embed>s"
@@ -698,7 +1331,7 @@ class Document:
                     siblings = []
                     for sib in el.itersiblings():
                         # self.debug(sib.text_content())
-                        sib_content_length = text_length(sib)
+                        sib_content_length = self.__metrics.text_length(sib)
                         if sib_content_length:
                             i += 1
                             siblings.append(sib_content_length)
@@ -706,7 +1339,7 @@ class Document:
                                 break
                     for sib in el.itersiblings(preceding=True):
                         # self.debug(sib.text_content())
-                        sib_content_length = text_length(sib)
+                        sib_content_length = self.__metrics.text_length(sib)
                         if sib_content_length:
                             j += 1
                             siblings.append(sib_content_length)
@@ -715,24 +1348,124 @@ class Document:
                     # self.debug(str(siblings))
                     if siblings and sum(siblings) > 1000:
                         to_remove = False
-                        self.debug("Allowing %s" % describe(el))
+                        if self.__trace is not None:
+                            self.__trace.add('kept', el, reason=reason, siblings_length=sum(siblings))
                         for desnode in self.__tags(el, "table", "ul", "div"):
                             allowed[desnode] = True
 
                 if to_remove:
-                    self.debug(
-                        "Cleaned %6.3f %s with weight %s cause it has %s." %
-                        (content_score, describe(el), weight, reason)
-                    )
+                    if self.__trace is not None:
+                        self.__trace.add(
+                            'removed', el, reason=reason, score=content_score, weight=weight,
+                            content_length=content_length, link_density=link_density, counts=counts)
                     # print tounicode(el)
                     # self.debug("pname %s pweight %.3f" %(pname, pweight))
                     self.__drop_node_and_empty_parents(el)
 
-        root = node.find(".//body")
-        if root is None:
-            root = node
-        self.__move_childrens_to_root(root)
-        self.__drop_empty_elements(root)
 
-        self.__cut_html = node
-        return self.__get_clean_html()
+# What Extractor.extract() found in a page. The fields which were not asked
+# for are None, `degraded` lists the limits the parse ran into, `stats` and
+# `trace` are set when the extractor collects them.
+Extraction = namedtuple(
+    'Extraction', FIELDS + ['encoding', 'degraded', 'stats', 'trace'],
+    defaults=[None] * (len(FIELDS) + 4))
+
+
+class Extractor:
+    """Settings of the extraction, prepared once for any number of pages.
+
+        extractor = Extractor(negative_keywords=["related"], max_nodes=100000)
+        for url, html in pages:
+            result = extractor.extract(html, base_url=url, fields=["title", "summary"])
+            store(url, result.title, result.summary)
+
+    The keywords are compiled and the classifier is looked up when the
+    extractor is built, not for every page. Extractors can not be changed
+    and can be shared by threads: every page gets a Document of its own.
+    The arguments are the settings of Document.__init__(), documents made
+    with the same ones share an extractor, see get_extractor().
+    """
+    __slots__ = (
+        'debug', 'positive_keywords', 'negative_keywords', 'min_text_length', 'retry_length',
+        'stats', 'trace', 'max_bytes', 'max_nodes', 'max_depth', 'deadline', 'templates',
+        'classifier')
+
+    def __init__(
+            self, debug=False,
+            positive_keywords=None, negative_keywords=None,
+            min_text_length=25, retry_length=250, stats=False, trace=False,
+            max_bytes=None, max_nodes=None, max_depth=None, deadline=None,
+            templates=None):
+        if max_depth is not None and max_depth < 1:
+            # <html> is at depth 1, nothing can be kept above it.
+            raise ValueError("max_depth must be at least 1, got %r" % max_depth)
+        settings = dict(
+            debug=debug, min_text_length=min_text_length, retry_length=retry_length,
+            stats=stats, trace=trace, max_bytes=max_bytes, max_nodes=max_nodes,
+            max_depth=max_depth, deadline=deadline, templates=templates,
+            positive_keywords=compile_pattern(positive_keywords),
+            negative_keywords=compile_pattern(negative_keywords))
+        regexes = Document.REGEXES
+        # Shared with the other extractors using the same keywords.
+        settings['classifier'] = get_classifier(
+            regexes['unlikelyCandidatesRe'], regexes['okMaybeItsACandidateRe'],
+            regexes['positiveRe'], regexes['negativeRe'],
+            settings['positive_keywords'], settings['negative_keywords'])
+        for name, value in settings.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Extractor settings can not be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("Extractor settings can not be changed")
+
+    def document(self, input, base_url=None, http_charset=None):
+        """Document of a page with these settings, see Document.__init__()
+        for the arguments."""
+        return Document.from_extractor(self, input, base_url, http_charset)
+
+    def extract(
+            self, input, base_url=None,
+            fields=["title", "summary", "content", "lead", "first_image_url", "main_image_url"],
+            http_charset=None, html_partial=False, output_format="html"):
+        """Extract `fields` from a page, see Document.parse().
+
+        :returns: an Extraction
+        """
+        doc = self.document(input, base_url, http_charset)
+        doc.parse(list(fields), html_partial=html_partial, output_format=output_format)
+        values = dict((field, getattr(doc, field)()) for field in fields)
+        return Extraction(
+            encoding=doc.encoding, degraded=tuple(doc.degraded()),
+            stats=doc.stats(), trace=doc.trace(), **values)
+
+
+# Extractors of the Document arguments seen lately.
+extractors = LRUCache(64)
+
+
+def get_extractor(
+        debug=False, positive_keywords=None, negative_keywords=None,
+        min_text_length=25, retry_length=250, stats=False, trace=False,
+        max_bytes=None, max_nodes=None, max_depth=None, deadline=None,
+        templates=None):
+    """Extractor with these settings, shared by the callers passing the
+    same ones. Keywords which can not be hashed, like lists of lists, give
+    a new extractor every time."""
+    settings = (
+        debug, positive_keywords, negative_keywords, min_text_length, retry_length, stats,
+        trace, max_bytes, max_nodes, max_depth, deadline, templates)
+    key = settings
+    if isinstance(positive_keywords, list) or isinstance(negative_keywords, list):
+        key = settings[:1] + tuple(
+            tuple(keywords) if isinstance(keywords, list) else keywords
+            for keywords in settings[1:3]) + settings[3:]
+    try:
+        extractor = extractors.get(key)
+    except TypeError:
+        return Extractor(*settings)
+    if extractor is None:
+        extractor = Extractor(*settings)
+        extractors.put(key, extractor)
+    return extractor
@@ -0,0 +1,96 @@
+import time
+from contextlib import nullcontext
+
+# Stage context used when stats are not collected, entering it does nothing.
+NO_STAGE = nullcontext()
+
+
+class ParseStats:
+    """What a Document.parse() call spent its time on.
+
+    `timings` maps stage names to seconds. A stage running inside another
+    one is only counted in the inner stage, so the timings add up to the
+    parse time. Stages run twice by the ruthless retry are summed.
+
+    :ivar encoding: encoding the page was decoded with, None for str input
+    :ivar encoding_source: where the encoding comes from, "bom", "http",
+        "declared", "host", "detector" or "default", None for str input
+    :ivar nodes_before_cleaning: elements of the parsed tree
+    :ivar nodes_after_cleaning: elements left by the lxml Cleaner
+    :ivar candidates: candidates scored in the last summary pass
+    :ivar ruthless_retry: the summary was extracted again without removing
+        unlikely candidates
+    :ivar raw_body_fallback: no candidate was found and the summary is the
+        whole body
+    :ivar degraded: limits of the document the parse ran into, see
+        Document.degraded()
+    :ivar template: "used" when the summary was looked for in the
+        container learned for the host (see readability.templates),
+        "failed" when that container did not pass the checks, else None
+    :ivar head_only: the fields were all found in the <head> of the page,
+        the rest of it was not parsed
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.encoding = None
+        self.encoding_source = None
+        self.nodes_before_cleaning = None
+        self.nodes_after_cleaning = None
+        self.candidates = None
+        self.ruthless_retry = False
+        self.raw_body_fallback = False
+        self.degraded = []
+        self.template = None
+        self.head_only = False
+        self.__nested = []
+
+    def stage(self, name):
+        return StageTimer(self, name)
+
+    def _add(self, name, elapsed):
+        nested = self.__nested.pop()
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed - nested
+        if self.__nested:
+            self.__nested[-1] += elapsed
+
+    def _start(self):
+        self.__nested.append(0.0)
+
+    def total(self):
+        return sum(self.timings.values())
+
+    def as_dict(self):
+        return {
+            'timings': dict(self.timings),
+            'encoding': self.encoding,
+            'encoding_source': self.encoding_source,
+            'nodes_before_cleaning': self.nodes_before_cleaning,
+            'nodes_after_cleaning': self.nodes_after_cleaning,
+            'candidates': self.candidates,
+            'ruthless_retry': self.ruthless_retry,
+            'raw_body_fallback': self.raw_body_fallback,
+            'degraded': list(self.degraded),
+            'template': self.template,
+            'head_only': self.head_only,
+        }
+
+    def __repr__(self):
+        return 'ParseStats(%r)' % self.as_dict()
+
+
+class StageTimer:
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.stats._start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats._add(self.name, time.perf_counter() - self.start)
+        return False
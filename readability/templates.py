@@ -0,0 +1,153 @@
+"""Article containers learned per host.
+
+Pages of a site usually keep their article in the same element. Once the
+best candidate of the pages of a host was found at the same place often
+enough, Document looks there first and scores the paragraphs of that
+element and its siblings only, instead of those of the whole page:
+
+    templates = TemplateStore()
+    for url, html in pages:
+        doc = Document(html, base_url=url, templates=templates)
+        doc.parse(["summary"])
+
+The place is a signature: the tag, id and class of the element and of each
+of its ancestors, positions left out so that an ad or a comment more or
+less does not move it. The learned element still has to pass cheap checks
+(it must be the best candidate near it, have enough text and not too many
+links), the page is scored as usual when it does not.
+"""
+import json
+import threading
+import time
+
+from lxml.etree import Element
+
+from .lru import LRUCache
+
+
+def element_signature(elem):
+    """(tag, id, class) of `elem` and its ancestors, root first."""
+    steps = []
+    while elem is not None:
+        steps.append((elem.tag, elem.get('id'), elem.get('class')))
+        elem = elem.getparent()
+    steps.reverse()
+    return tuple(steps)
+
+
+def find_signature(root, signature):
+    """The element of `root` having `signature`, None when there is no
+    such element or more than one."""
+    if not signature or (root.tag, root.get('id'), root.get('class')) != signature[0]:
+        return None
+    found = [root]
+    for tag, id, class_ in signature[1:]:
+        found = [child for elem in found for child in elem.iterchildren(Element)
+                 if child.tag == tag and child.get('id') == id and child.get('class') == class_]
+        if not found:
+            return None
+    if len(found) != 1:
+        return None
+    return found[0]
+
+
+class TemplateStore:
+    """Signature of the article container of each host, with a confidence.
+
+    A page scored as usual adds one to the confidence of its host when its
+    best candidate has the signature already known, and replaces it
+    otherwise. Pages which needed the lenient retry, and learned signatures
+    failing their checks, halve it. The confidence also halves every
+    `half_life` seconds, and pages extracted through the template do not
+    raise it: a host is scored in full again from time to time, which
+    learns the new container of a site that changed.
+
+    :param min_pages: confidence a signature needs to be used
+    :param max_confidence: confidence kept at most
+    :param half_life: seconds after which a confidence is halved
+    :param max_link_density: link density the learned element may have
+    :param max_hosts: hosts remembered, the least recently used are
+        forgotten
+
+    `hits` counts the pages extracted through a template, `learned` the
+    pages scored in full and `misses` those of them where a template was
+    tried first and failed. Instances are thread safe and can be shared by documents.
+    """
+
+    def __init__(self, min_pages=3, max_confidence=10, half_life=7 * 24 * 3600,
+                 max_link_density=0.33, max_hosts=10000):
+        self.min_pages = min_pages
+        self.max_confidence = max_confidence
+        self.half_life = half_life
+        self.max_link_density = max_link_density
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.__hosts = LRUCache(max_hosts)
+        self.__lock = threading.Lock()
+
+    def lookup(self, host):
+        """Signature to try for a page of `host`, None if there is none
+        trusted enough."""
+        entry = self.__hosts.get(host)
+        if entry is None or self.__confidence(entry, time.time()) < self.min_pages:
+            return None
+        return entry[0]
+
+    def observe(self, host, signature):
+        """Record the signature of the best candidate of a page of `host`
+        scored in full, None if the page had to be retried."""
+        now = time.time()
+        with self.__lock:
+            self.learned += 1
+            entry = self.__hosts.get(host)
+            if signature is None:
+                if entry is not None:
+                    self.__hosts.put(host, (entry[0], self.__confidence(entry, now) / 2, now))
+            elif entry is not None and entry[0] == signature:
+                confidence = min(self.__confidence(entry, now) + 1, self.max_confidence)
+                self.__hosts.put(host, (signature, confidence, now))
+            else:
+                self.__hosts.put(host, (signature, 1.0, now))
+
+    def hit(self, host):
+        with self.__lock:
+            self.hits += 1
+
+    def miss(self, host):
+        """The signature of `host` was not found on a page or failed its
+        checks."""
+        now = time.time()
+        with self.__lock:
+            self.misses += 1
+            entry = self.__hosts.get(host)
+            if entry is not None:
+                self.__hosts.put(host, (entry[0], self.__confidence(entry, now) / 2, now))
+
+    def confidence(self, host):
+        entry = self.__hosts.get(host)
+        return self.__confidence(entry, time.time()) if entry is not None else 0.0
+
+    def hit_rate(self):
+        total = self.hits + self.learned
+        return float(self.hits) / total if total else 0.0
+
+    def save(self, path):
+        """Write the signatures to a JSON file, see load()."""
+        with open(path, 'w') as f:
+            json.dump([[host, [list(step) for step in signature], confidence, updated]
+                       for host, (signature, confidence, updated) in self.__hosts.items()], f)
+
+    def load(self, path):
+        """Add the signatures of a file written by save()."""
+        with open(path) as f:
+            hosts = json.load(f)
+        with self.__lock:
+            for host, signature, confidence, updated in hosts:
+                self.__hosts.put(host, (tuple(tuple(step) for step in signature), confidence, updated))
+
+    def __confidence(self, entry, now):
+        signature, confidence, updated = entry
+        if self.half_life and now > updated:
+            confidence *= 0.5 ** int((now - updated) / self.half_life)
+        return confidence
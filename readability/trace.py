@@ -0,0 +1,67 @@
+import itertools
+import logging
+
+# Documents seen by sampled(), shared by all documents of the process.
+_documents = itertools.count()
+
+
+def sampled(every):
+    """True for one call in `every`."""
+    if not every:
+        return False
+    return next(_documents) % every == 0
+
+
+def describe(node, depth=1):
+    if not hasattr(node, 'tag'):
+        return "[%s]" % type(node)
+    name = node.tag
+    if node.get('id', ''):
+        name += '#' + node.get('id')
+    if node.get('class', ''):
+        name += '.' + node.get('class').replace(' ', '.')
+    if name[:4] in ['div#', 'div.']:
+        name = name[3:]
+    if depth and node.getparent() is not None:
+        return name + ' - ' + describe(node.getparent(), depth - 1)
+    return name
+
+
+class Trace:
+    """Decisions taken while extracting one document.
+
+    `events` is a list of dicts in the order the decisions were taken.
+    Every event has an "event" key, events about an element also have its
+    "node" description and its XPath "path" at that time. The events are:
+
+    - candidate: a scored candidate, with its "score", "link_density" and
+      the "final" score scaled by the link density
+    - best: the chosen candidate with its "score", and the "runners_up"
+      as (node, score) pairs
+    - removed: an element dropped, with the "reason" and the measurements
+      that led to it
+    - kept: an element that would have been removed but is kept because
+      of its long siblings
+    - retry: the summary is extracted again without removing unlikely
+      candidates, with the "reason"
+    - raw_body: no candidate was found, the summary is the whole body
+    - degraded: a "limit" of the document was hit, with the "stage" skipped
+      for the deadline
+    - template: the container learned for the host, "used" as the best
+      candidate with its "score" or not when it failed the checks
+
+    :param log: also send every event to logging.debug as it is added
+    """
+
+    def __init__(self, log=False):
+        self.events = []
+        self.log = log
+
+    def add(self, event, elem=None, **data):
+        data['event'] = event
+        if elem is not None:
+            data['node'] = describe(elem)
+            data['path'] = elem.getroottree().getpath(elem)
+        self.events.append(data)
+        if self.log:
+            logging.debug("%s: %r", event, data)
@@ -13,6 +13,9 @@ setup(
     license="Apache License 2.0",
     url="http://github.com/stalkerg/python-readability",
     packages=['readability'],
+    entry_points={
+        "console_scripts": ["readability=readability.__main__:main"],
+    },
     install_requires=[
         "chardet",
         "lxml",
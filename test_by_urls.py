@@ -1,26 +1,58 @@
-from readability import Document
-import urllib.parse
-import urllib.request
+from readability.pipeline import extract_urls
+import concurrent.futures
+import asyncio
 import hashlib
+import logging
 import os
 
-import io
-import gzip
 import argparse
 
 
-class MyDocument(Document):
-	def __init__(self, *argc, **argkw):
-		super(MyDocument, self).__init__(*argc, **argkw)
+def save_result(url, url_hex, fields):
+	try:
+		os.mkdir(os.path.join("test_by_urls", url_hex))
+	except:
+		pass
 
-	def debug(self, *a):
-		print(*a)
+	for name, value in [
+			("url", url),
+			("summary.html", fields.get("summary")),
+			("title", fields.get("title")),
+			("lead", fields.get("lead")),
+			("img", fields.get("main_image_url"))]:
+		with open(os.path.join("test_by_urls", url_hex, name), "w") as f:
+			f.write(value or "")
+
+
+async def main(url_list, args):
+	loop = asyncio.get_running_loop()
+	with concurrent.futures.ProcessPoolExecutor(args.workers) as executor:
+		results = extract_urls(
+			url_list,
+			fields=["summary", "title", "lead", "main_image_url"],
+			concurrency=args.concurrency, per_host=args.per_host,
+			extractors=args.workers, executor=executor,
+			html_partial=True, debug=args.debug)
+		async for url, result in results:
+			url_hex = hashlib.md5(url.encode("utf-8")).hexdigest()[:4]
+			print("Parsed url: %s by hash: %s" % (url, url_hex))
+			if result.error:
+				print("Error %s" % result.error)
+				if result.response is None or result.response.status != 200:
+					continue
+			await loop.run_in_executor(None, save_result, url, url_hex, result.fields or {})
 
 
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser()
 	parser.add_argument('--count', nargs='?', default=None, help='count test')
+	parser.add_argument('--concurrency', type=int, default=16, help='pages fetched at once')
+	parser.add_argument('--per-host', type=int, default=4, help='pages fetched at once per host')
+	parser.add_argument('--workers', type=int, default=os.cpu_count(), help='extraction processes')
+	parser.add_argument('--debug', action='store_true', help='print extraction debug messages')
 	args = parser.parse_args()
+	if args.debug:
+		logging.basicConfig(level=logging.DEBUG)
 
 	try:
 		os.mkdir("test_by_urls")
@@ -31,61 +63,10 @@ if __name__ == "__main__":
 	url_list = []
 
 	for url in url_list_file:
-		url_list.append(url)
+		if url.strip():
+			url_list.append(url.strip())
 
 	if args.count:
 		url_list = url_list[:int(args.count)]
 
-	for url in url_list:
-		url_hex = hashlib.md5(url.encode("utf-8")).hexdigest()[:4]
-		print("Start parse url: %s by hash: %s" % (url, url_hex))
-		try:
-			request = urllib.request.Request(url)
-			request.add_header('Accept-encoding', 'gzip')
-			request.add_header(
-				"User-Agent",
-				"Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/36.0.1985.103 Safari/537.36"
-			)
-			response = urllib.request.urlopen(request)
-		except Exception as e:
-			print("Error load url %s" % e)
-			continue
-
-		html = ""
-		if response.info().get('Content-Encoding') == 'gzip':
-			buf = io.BytesIO(response.read())
-			f = gzip.GzipFile(fileobj=buf)
-			html = f.read()
-		else:
-			html = response.read()
-
-		doc = MyDocument(html, base_url=url)
-		try:
-			doc.parse(["summary", "title", "lead", "main_image_url"], html_partial=True)
-		except Exception as e:
-			print(e)
-
-		try:
-			os.mkdir(os.path.join("test_by_urls", url_hex))
-		except:
-			pass
-
-		url_file = open(os.path.join("test_by_urls", url_hex, "url"), "w")
-		url_file.write(url)
-		url_file.close()
-
-		summary_file = open(os.path.join("test_by_urls", url_hex, "summary.html"), "w")
-		summary_file.write(doc.summary() or "")
-		summary_file.close()
-
-		title_file = open(os.path.join("test_by_urls", url_hex, "title"), "w")
-		title_file.write(doc.title() or "")
-		title_file.close()
-
-		lead_file = open(os.path.join("test_by_urls", url_hex, "lead"), "w")
-		lead_file.write(doc.lead() or "")
-		lead_file.close()
-
-		img_file = open(os.path.join("test_by_urls", url_hex, "img"), "w")
-		img_file.write(doc.main_image_url() or "")
-		img_file.close()
+	asyncio.run(main(url_list, args))
@@ -0,0 +1,32 @@
+import unittest
+
+from readability.batch import extract_many
+from .test_article_only import load_sample
+
+
+class TestExtractMany(unittest.TestCase):
+
+    def setUp(self):
+        sample = load_sample('si-game.sample.html')
+        self.pages = [sample, "", (sample, "http://sportsillustrated.cnn.com/mlb/")] * 3
+
+    def check(self, results):
+        self.assertEqual(list(range(len(self.pages))), sorted(r.index for r in results))
+        for result in results:
+            if result.index % 3 == 1:
+                self.assertIsNone(result.fields)
+                self.assertTrue(result.error)
+            else:
+                self.assertIsNone(result.error)
+                self.assertTrue(result.fields["summary"].startswith("<html><body><h1>Tigers-Roya"))
+
+    def test_in_process(self):
+        self.check(list(extract_many(self.pages, workers=1, chunksize=2)))
+
+    def test_ordered(self):
+        results = list(extract_many(self.pages, workers=2, chunksize=2, max_tasks_per_worker=1))
+        self.assertEqual(list(range(len(self.pages))), [r.index for r in results])
+        self.check(results)
+
+    def test_as_completed(self):
+        self.check(list(extract_many(self.pages, workers=2, chunksize=1, ordered=False)))
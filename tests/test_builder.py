@@ -0,0 +1,76 @@
+import gzip
+import io
+import unittest
+import zlib
+
+from readability import Document
+from readability.builder import DocumentBuilder
+from readability.builder import build_document
+from .test_article_only import load_sample
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestDocumentBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.page = load_sample('si-game.sample.html').encode('utf-8')
+        self.expected = self.extract(Document(self.page))
+
+    def extract(self, doc):
+        doc.parse(["title", "summary"])
+        return doc.encoding, doc.title(), doc.summary()
+
+    def test_chunks_give_the_whole_page_result(self):
+        for size in [1, 1000, len(self.page)]:
+            doc = build_document(chunks(self.page, size))
+            self.assertEqual(self.expected, self.extract(doc))
+
+    def test_gzip_is_decompressed(self):
+        compressed = gzip.compress(self.page)
+        self.assertEqual(self.expected, self.extract(build_document(io.BytesIO(compressed), read_size=512)))
+        doc = build_document(chunks(compressed, 512), content_encoding="gzip")
+        self.assertEqual(self.expected, self.extract(doc))
+
+    def test_stop_at_body_end(self):
+        page = b"<html><body><p>" + b"text " * 100 + b"</p></body></html><p>ignored</p>"
+        builder = DocumentBuilder(stop_at_body_end=True)
+        fed = 0
+        for chunk in chunks(page, 10):
+            fed += 1
+            if builder.feed(chunk):
+                break
+        self.assertLess(fed, len(chunks(page, 10)))
+        doc = builder.close()
+        doc.parse(["summary"])
+        self.assertNotIn("ignored", doc.summary())
+
+    def test_tree_is_parsed_once(self):
+        doc = build_document([self.page])
+        doc.parse(["title"])
+        self.assertRaises(ValueError, doc.parse, ["title"])
+
+    def test_deflate_with_or_without_zlib_header(self):
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        for compressed in [zlib.compress(self.page), raw.compress(self.page) + raw.flush()]:
+            for size in [1, 512]:
+                doc = build_document(chunks(compressed, size), content_encoding="deflate")
+                self.assertEqual(self.expected, self.extract(doc))
+
+    def test_invalid_bytes_are_replaced_as_by_document(self):
+        text = "<p>Тест %s</p>" % ("слово " * 40)
+        page = ("<html><head><meta charset='utf-8'><title>Заголовок страницы</title></head><body>%s"
+                % (text * 100)).encode('utf-8') + b"<p>bad \xff byte</p>" + (text * 20).encode('utf-8')
+        expected = self.extract(Document(page))
+        self.assertIn("�", expected[2])
+        for size in [1, 7, 4096]:
+            self.assertEqual(expected, self.extract(build_document(chunks(page, size))))
+
+    def test_invalid_bytes_in_a_single_byte_encoding(self):
+        page = ("<html><head><meta charset='windows-1251'></head><body><p>%s</p>"
+                % ("Тест слово " * 2000)).encode('cp1251') + b"<p>bad \x98 byte</p>"
+        expected = self.extract(Document(page))
+        for size in [1, 4096]:
+            self.assertEqual(expected, self.extract(build_document(chunks(page, size))))
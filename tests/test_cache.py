@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from readability.batch import extract_many
+from readability.cache import ResultCache
+from .test_article_only import load_sample
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "results.db")
+        self.sample = load_sample('si-game.sample.html')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_key(self):
+        key = ResultCache.key
+        self.assertEqual(key(self.sample, ["title"]),
+                         key(self.sample, ["title"], min_text_length=25, debug=True))
+        self.assertNotEqual(key(self.sample, ["title"]), key(self.sample, ["summary"]))
+        self.assertNotEqual(key(self.sample, ["title"]), key(self.sample, ["title"], min_text_length=5))
+        self.assertNotEqual(key(self.sample, ["title"]), key(self.sample.encode('utf-8'), ["title"]))
+
+    def test_memory_and_disk(self):
+        cache = ResultCache(self.path)
+        fields = cache.extract(self.sample, ["title", "summary"])
+        self.assertEqual(fields, cache.extract(self.sample, ["title", "summary"]))
+        cache.close()
+
+        cache = ResultCache(self.path)
+        self.assertEqual(fields, cache.extract(self.sample, ["title", "summary"]))
+        self.assertEqual(fields, cache.extract(self.sample, ["title", "summary"]))
+        self.assertEqual({'memory_hits': 1, 'disk_hits': 1, 'misses': 0, 'stores': 0, 'evictions': 0},
+                         cache.counters())
+        cache.close()
+
+    def test_max_age(self):
+        cache = ResultCache(max_age=60)
+        key = cache.key(self.sample, ["title"])
+        cache.put(key, {"title": "x"})
+        self.assertEqual({"title": "x"}, cache.get(key))
+        cache.max_age = 0
+        time.sleep(0.01)
+        self.assertIsNone(cache.get(key))
+
+    def test_eviction(self):
+        cache = ResultCache(self.path, max_bytes=2000)
+        for i in range(20):
+            cache.put(str(i), {"summary": os.urandom(100).hex()})
+        self.assertTrue(cache.evictions)
+        cache.memory.clear()
+        self.assertIsNone(cache.get("0"))
+        self.assertIsNotNone(cache.get("19"))
+        cache.close()
+
+    def test_expired_rows_are_deleted_under_max_bytes(self):
+        cache = ResultCache(self.path, max_age=0.05)
+        cache.put("old", {"title": "x"})
+        time.sleep(0.1)
+        cache.put("new", {"title": "y"})
+        self.assertEqual(1, cache.evictions)
+        cache.close()
+
+        time.sleep(0.1)
+        cache = ResultCache(self.path, max_age=0.05)
+        self.assertEqual(1, cache.evictions)
+        cache.max_age = None
+        self.assertIsNone(cache.get("new"))
+        cache.close()
+
+    def test_extract_many(self):
+        pages = [self.sample, "", self.sample + " "]
+        cache = ResultCache()
+        first = list(extract_many(pages, workers=1, cache=cache))
+        self.assertEqual(2, cache.stores)
+        for workers, ordered in [(1, True), (2, True), (2, False)]:
+            results = list(extract_many(pages, workers=workers, ordered=ordered, cache=cache))
+            self.assertEqual(first, sorted(results, key=lambda result: result.index))
+        self.assertEqual(2, cache.stores)
+
+    def test_mixed_chunk_as_completed(self):
+        # The failed page comes first in its chunk.
+        pages = ["", self.sample]
+        cache = ResultCache()
+        results = list(extract_many(pages, workers=2, chunksize=2, ordered=False, cache=cache))
+        self.assertIsNotNone(results[0].error)
+        self.assertIsNone(results[1].error)
+        self.assertEqual(1, cache.stores)
@@ -0,0 +1,52 @@
+import re
+import unittest
+
+from readability.classifier import get_classifier
+from readability.readability import Document, compile_pattern
+
+REGEXES = Document.REGEXES
+
+
+def classifier(positive=None, negative=None):
+    return get_classifier(
+        REGEXES["unlikelyCandidatesRe"], REGEXES["okMaybeItsACandidateRe"],
+        REGEXES["positiveRe"], REGEXES["negativeRe"], positive, negative)
+
+
+def separate(string, positive=None, negative=None):
+    weight = 0
+    for pattern, change in [(REGEXES["negativeRe"], -25), (REGEXES["positiveRe"], 25),
+                            (positive, 25), (negative, -25)]:
+        if pattern is not None and pattern.search(string):
+            weight += change
+    unlikely = bool(REGEXES["unlikelyCandidatesRe"].search(string)
+                    and not REGEXES["okMaybeItsACandidateRe"].search(string))
+    return unlikely, weight
+
+
+class TestClassifier(unittest.TestCase):
+
+    STRINGS = [
+        "", "post", "mastheader", "MastHead", "sidebar-main", "comment-body",
+        "entry-content hentry", "footnote", "shoutbox", "article sponsor", "x-combx",
+    ]
+
+    def test_matches_separate_regexes(self):
+        for positive, negative in [(None, None),
+                                   (compile_pattern("news-item,tag-p"), compile_pattern("mast,header")),
+                                   (re.compile("ma(st)?"), re.compile("^side"))]:
+            c = classifier(positive, negative)
+            for string in self.STRINGS:
+                self.assertEqual(separate(string, positive, negative),
+                                 (c.is_unlikely(string), c.weight(string)), string)
+
+    def test_shared_between_documents(self):
+        html = '<html><body><div class="sidebar"><p>text</p></div></body></html>'
+        first = Document(html)
+        second = Document(html)
+        self.assertIs(first.classifier, second.classifier)
+        self.assertIsNot(first.classifier, Document(html, positive_keywords=["block"]).classifier)
+        first.parse(["summary"])
+        hits = first.classifier.cache.hits
+        second.parse(["summary"])
+        self.assertGreater(second.classifier.cache.hits, hits)
@@ -0,0 +1,24 @@
+import unittest
+
+from lxml.html import fragment_fromstring
+from lxml.html import tostring
+
+from readability.cleaners import clean_attributes
+from readability.cleaners import strip_attributes
+
+
+class TestStripAttributes(unittest.TestCase):
+
+    def strip(self, html):
+        elem = fragment_fromstring(html)
+        strip_attributes(elem)
+        return tostring(elem, encoding='unicode')
+
+    def test_same_as_clean_attributes(self):
+        html = ('<div style="x" class="a b" id="i" data-id="d" bgcolor="red" text-color="c" '
+                'background-image="u" href="h"><p class="" onclick="f()">t</p></div>')
+        self.assertEqual(clean_attributes(html), self.strip(html))
+
+    def test_gt_in_attribute_value(self):
+        self.assertEqual('<p title="a &gt; b id=c">t</p>',
+                         self.strip('<p class="x" title="a > b id=c">t</p>'))
@@ -0,0 +1,306 @@
+import mmap
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml.etree import tostring
+from lxml.etree import tounicode
+
+from readability import Document
+from readability import Extractor
+from .test_article_only import load_sample
+
+
+class TestParseFields(unittest.TestCase):
+    """Fields extracted together must match fields extracted alone"""
+
+    def test_fields_share_one_tree(self):
+        sample = load_sample('si-game.sample.html')
+        doc = Document(sample)
+        doc.parse()
+
+        for field in ["title", "summary", "content", "lead", "main_image_url"]:
+            alone = Document(sample)
+            alone.parse([field])
+            self.assertEqual(getattr(alone, field)(), getattr(doc, field)(), field)
+
+
+class TestHeadOnly(unittest.TestCase):
+    """Title and meta image are found in the <head> without parsing the rest"""
+
+    def setUp(self):
+        self.sample = load_sample('si-game.sample.html').replace(
+            '<head>', '<head><meta property="og:image" content="/og.png">')
+        self.full = Document(self.sample)
+        self.full.parse()
+
+    def test_head_fields(self):
+        doc = Document(self.sample, stats=True)
+        doc.parse(["title", "main_image_url"])
+        self.assertTrue(doc.stats().head_only)
+        self.assertNotIn('cleaner', doc.stats().timings)
+        self.assertEqual(self.full.title(), doc.title())
+        self.assertEqual('/og.png', doc.main_image_url())
+
+    def test_body_fields_are_extracted_on_first_access(self):
+        doc = Document(self.sample, stats=True)
+        doc.parse(["title"])
+        self.assertEqual(self.full.summary(), doc.summary())
+        self.assertEqual(self.full.content(), doc.content())
+        self.assertFalse(doc.stats().head_only)
+        self.assertEqual(self.full.title(), doc.title())
+
+    def test_falls_back_to_the_whole_page(self):
+        for page, fields in [
+                (load_sample('si-game.sample.html'), ["title", "main_image_url"]),
+                (self.sample.replace('</head>', ''), ["title"]),
+                (self.sample.encode('utf-8'), ["title", "summary"])]:
+            doc = Document(page, stats=True)
+            doc.parse(fields)
+            self.assertFalse(doc.stats().head_only)
+            self.assertIn('cleaner', doc.stats().timings)
+            self.assertEqual(self.full.title(), doc.title())
+
+
+class TestExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.sample = load_sample('si-game.sample.html')
+        self.extractor = Extractor(negative_keywords=["related"], retry_length=200)
+
+    def test_extract(self):
+        doc = Document(self.sample, base_url="http://si.com/game", negative_keywords=["related"],
+                       retry_length=200)
+        doc.parse(["title", "summary"])
+        result = self.extractor.extract(self.sample, base_url="http://si.com/game", fields=["title", "summary"])
+        self.assertEqual((doc.title(), doc.summary()), (result.title, result.summary))
+        self.assertIsNone(result.content)
+        self.assertEqual((), result.degraded)
+
+    def test_settings_are_shared_and_frozen(self):
+        first = Document(self.sample, negative_keywords=["related"], retry_length=200)
+        second = Document(self.sample, negative_keywords=["related"], retry_length=200)
+        self.assertIs(first.extractor, second.extractor)
+        self.assertIsNot(first.extractor, Document(self.sample).extractor)
+        with self.assertRaises(AttributeError):
+            self.extractor.retry_length = 10
+
+    def test_threads(self):
+        fields = ["title", "summary", "lead"]
+        expected = self.extractor.extract(self.sample, fields=fields)
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(
+                lambda _: self.extractor.extract(self.sample, fields=fields), range(32)))
+        self.assertEqual([expected] * 32, results)
+
+
+def nested_divs(depth, width):
+    leaf = "<div>some words, and more words <b>bold</b> here</div>" * width
+    return "<html><body>" + ("<div>" + leaf) * depth + "</div>" * depth + "</body></html>"
+
+
+class TestMisusedDivs(unittest.TestCase):
+
+    def test_descendants_are_checked(self):
+        # The first div of each pair holds a block element below an inline
+        # one and stays a div, the second one becomes a paragraph.
+        text = "Some text of the article, long enough to be scored as content, with commas."
+        page = "<html><body><div id='article'>%s</div></body></html>" % "".join(
+            "<div><span><img src='/%d.png' width='200'></span>%s</div><div><span>%s</span></div>"
+            % (i, text, text) for i in range(5))
+        doc = Document(page)
+        doc.parse(["summary"])
+        summary = doc.summary()
+        self.assertEqual(5, summary.count("<div><span><img"))
+        self.assertEqual(5, summary.count("<p><span>Some text"))
+
+    def test_deep_nesting_is_linear(self):
+        # Serializing the children of every div took time growing with the
+        # depth for each of them. The number of serializations must not
+        # depend on the depth, see benchmarks/bench_nesting.py for timings.
+        def serializations(depth):
+            with mock.patch('readability.readability.tostring', wraps=tostring) as text, \
+                    mock.patch('readability.readability.tounicode', wraps=tounicode) as html:
+                Document(nested_divs(depth, 20)).parse(["summary"])
+            return text.call_count + html.call_count
+
+        self.assertEqual(serializations(25), serializations(200))
+
+
+class TestParseStats(unittest.TestCase):
+
+    def test_disabled_by_default(self):
+        doc = Document(load_sample('si-game.sample.html'))
+        doc.parse(["summary"])
+        self.assertIsNone(doc.stats())
+
+    def test_stages_and_counters(self):
+        page = u'<html><head><meta charset="cp1251"><script>x()</script></head><body>%s</body></html>' % (
+            u'<div><p>Съешь же ещё этих мягких французских булок, да выпей чаю.</p></div>' * 20)
+        doc = Document(page.encode('cp1251'), stats=True)
+        doc.parse(["title", "summary"])
+        stats = doc.stats()
+        self.assertEqual('cp1251', stats.encoding)
+        self.assertEqual('declared', stats.encoding_source)
+        self.assertLess(stats.nodes_after_cleaning, stats.nodes_before_cleaning)
+        # every div and the body
+        self.assertEqual(21, stats.candidates)
+        self.assertFalse(stats.ruthless_retry)
+        self.assertFalse(stats.raw_body_fallback)
+        for stage in ['encoding', 'build_doc', 'cleaner', 'score_paragraphs', 'sanitize', 'serialize']:
+            self.assertIn(stage, stats.timings)
+
+    def test_fallbacks(self):
+        doc = Document("<html><body><div class='sidebar'>short</div></body></html>", stats=True)
+        doc.parse(["summary"])
+        stats = doc.stats()
+        self.assertIsNone(stats.encoding_source)
+        self.assertTrue(stats.ruthless_retry)
+        self.assertTrue(stats.raw_body_fallback)
+        self.assertEqual(0, stats.candidates)
+
+
+class TestTrace(unittest.TestCase):
+
+    def test_disabled_by_default(self):
+        doc = Document(load_sample('si-game.sample.html'))
+        doc.parse(["summary"])
+        self.assertIsNone(doc.trace())
+
+    def test_events(self):
+        doc = Document(load_sample('si-game.sample.html'), trace=True)
+        doc.parse(["summary"])
+        events = doc.trace()
+        kinds = set(event['event'] for event in events)
+        self.assertTrue({'candidate', 'best', 'removed'} <= kinds)
+        best = [event for event in events if event['event'] == 'best'][-1]
+        self.assertEqual('.cnnLeft', best['node'].split(' - ')[0])
+        self.assertTrue(best['path'].startswith('/html/body'))
+        for event in events:
+            if event['event'] == 'removed':
+                self.assertTrue(event['reason'])
+
+    def test_sampling(self):
+        traced = 0
+        for _ in range(6):
+            doc = Document("<html><body><p>text</p></body></html>", trace=3)
+            doc.parse(["summary"])
+            traced += doc.trace() is not None
+        self.assertEqual(2, traced)
+
+
+class TestRuthlessRetry(unittest.TestCase):
+
+    def test_lenient_pass_starts_from_the_unpruned_tree(self):
+        # The article is in an "unlikely" container: the ruthless pass
+        # removes it and only finds the short teaser.
+        paragraph = "<p>Paragraph %d of the article, long enough to be scored as content.</p>"
+        page = ("<html><body><div class='teaser'><p>A teaser paragraph, shorter than the retry length.</p></div>"
+                "<div class='comments'>%s</div></body></html>" % "".join(paragraph % i for i in range(20)))
+        doc = Document(page, stats=True)
+        doc.parse(["summary"])
+        self.assertTrue(doc.stats().ruthless_retry)
+        self.assertIn("Paragraph 19 of the article", doc.summary())
+
+    def test_changes_of_the_ruthless_pass_are_undone(self):
+        # The ruthless pass moves the teaser out of the tree, renames its
+        # tags, strips its attributes and turns its loose text into
+        # paragraphs. The lenient pass must see it as it was.
+        paragraph = "<p>Paragraph %d of the article, long enough to be scored as content.</p>"
+        page = ("<html><body><div class='teaser'><p>A <strong>teaser</strong> paragraph, shorter than "
+                "the retry length.</p><div>Loose text<br>after a break</div></div>"
+                "<div class='comments'>%s<div>Closing <em>words</em> of the article.</div></div>"
+                "</body></html>" % "".join(paragraph % i for i in range(20)))
+        doc = Document(page, stats=True)
+        doc.parse(["summary"])
+        summary = doc.summary()
+        self.assertTrue(doc.stats().ruthless_retry)
+        self.assertEqual(1, summary.count("<p>A <b>teaser</b> paragraph"))
+        self.assertIn("<p>Loose text<br/>after a break</p>", summary)
+        self.assertIn("<p>Closing <i>words</i> of the article.</p>", summary)
+
+
+class TestLimits(unittest.TestCase):
+
+    paragraph = "<p>Paragraph %d of the article, long enough to be scored as content.</p>"
+
+    def page(self, count):
+        return ("<html><body><div class='article'>%s</div></body></html>"
+                % "".join(self.paragraph % i for i in range(count)))
+
+    def test_within_limits(self):
+        doc = Document(self.page(10), max_bytes=10000, max_nodes=100, max_depth=10, deadline=60)
+        doc.parse(["summary"])
+        self.assertEqual([], doc.degraded())
+        self.assertIn("Paragraph 9 of", doc.summary())
+
+    def test_max_nodes_truncates_the_page(self):
+        doc = Document(self.page(50), max_nodes=20)
+        doc.parse(["summary"])
+        self.assertEqual(["max_nodes"], doc.degraded())
+        self.assertIn("Paragraph 10 of", doc.summary())
+        self.assertNotIn("Paragraph 30 of", doc.summary())
+
+    def test_max_bytes_truncates_the_input(self):
+        page = self.page(50).encode("utf-8")
+        doc = Document(page, max_bytes=len(page) // 2, stats=True)
+        doc.parse(["summary"])
+        self.assertEqual(["max_bytes"], doc.stats().degraded)
+        self.assertNotIn("Paragraph 40 of", doc.summary())
+
+    def test_max_depth_keeps_the_text(self):
+        page = "<html><body>%s%s%s</body></html>" % (
+            "<div>" * 50, "".join(self.paragraph % i for i in range(10)), "</div>" * 50)
+        doc = Document(page, max_depth=10)
+        doc.parse(["summary"])
+        self.assertEqual(["max_depth"], doc.degraded())
+        self.assertIn("Paragraph 9 of", doc.summary())
+        for max_depth in (0, -1):
+            self.assertRaises(ValueError, Document, page, max_depth=max_depth)
+
+    def test_deadline_returns_the_raw_body(self):
+        doc = Document(self.page(10), deadline=0, trace=True)
+        doc.parse(["summary"])
+        self.assertEqual(["deadline"], doc.degraded())
+        self.assertIn("Paragraph 9 of", doc.summary())
+        self.assertEqual([{"event": "degraded", "limit": "deadline", "stage": "score"}],
+                         [e for e in doc.trace() if e["event"] == "degraded"])
+
+
+class TestBufferInput(unittest.TestCase):
+
+    def setUp(self):
+        self.sample = load_sample('si-game.sample.html').encode('utf-8')
+        doc = Document(self.sample)
+        doc.parse(["title", "summary"])
+        self.expected = (doc.title(), doc.summary())
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "archive")
+        # Pages stored one after the other, the second one not aligned.
+        with open(self.path, "wb") as f:
+            f.write(b"x" * 5000 + self.sample + self.sample)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def extract(self, doc):
+        doc.parse(["title", "summary"])
+        return doc.title(), doc.summary()
+
+    def test_buffers(self):
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)[5000:5000 + len(self.sample)]
+        self.assertEqual(self.expected, self.extract(Document.from_buffer(view)))
+        self.assertEqual(self.expected, self.extract(Document(bytearray(self.sample))))
+        view.release()
+        mapped.close()
+
+    def test_from_path(self):
+        offset = 5000 + len(self.sample)
+        self.assertEqual(self.expected, self.extract(
+            Document.from_path(self.path, offset, len(self.sample))))
+        self.assertEqual(self.expected, self.extract(Document.from_path(self.path, offset)))
@@ -0,0 +1,78 @@
+import codecs
+import os
+import unittest
+
+from readability import encoding
+from readability.encoding import detect_encoding
+from readability.encoding import get_encoding
+from readability.encoding import set_detector
+from readability.encoding import set_host_cache
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'corpus')
+
+
+class TestDetectEncoding(unittest.TestCase):
+
+    def tearDown(self):
+        set_detector(None)
+        set_host_cache(None)
+
+    def test_bom(self):
+        page = codecs.BOM_UTF8 + '<p>привет</p>'.encode('utf-8')
+        self.assertEqual(('utf-8-sig', 'bom'), detect_encoding(page))
+
+    def test_declared(self):
+        page = b'<html><head><meta charset="windows-1251"></head></html>'
+        self.assertEqual(('windows-1251', 'declared'), detect_encoding(page))
+
+    def test_http_charset_wins_over_declared(self):
+        page = '<meta charset="koi8-r"><p>привет</p>'.encode('utf-8')
+        self.assertEqual(('utf-8', 'http'), detect_encoding(page, http_charset='UTF-8'))
+
+    def test_invalid_declared_is_skipped(self):
+        page = '<meta charset="utf-8"><p>привет, мир</p>'.encode('cp1251')
+        set_detector(lambda sample: 'cp1251')
+        self.assertEqual(('cp1251', 'detector'), detect_encoding(page))
+
+    def test_declaration_after_head_is_ignored(self):
+        page = b'<head></head><body><meta charset="koi8-r"></body>'
+        self.assertEqual('utf-8', get_encoding(page))
+
+    def test_detector_gets_bounded_sample(self):
+        samples = []
+        set_detector(lambda sample: samples.append(sample) or 'utf-8')
+        get_encoding(b'<p>' + b'text ' * 100000 + b'</p>')
+        self.assertLessEqual(len(samples[0]), encoding.DETECT_SAMPLE_BYTES)
+
+    def test_host_cache(self):
+        declared = '<meta charset="cp1251"><p>привет</p>'.encode('cp1251')
+        undeclared = '<p>привет, мир</p>'.encode('cp1251')
+        set_detector(lambda sample: None)
+        get_encoding(declared, host='example.com')
+        self.assertEqual(('utf-8', 'default'), detect_encoding(undeclared, host='example.com'))
+
+        set_host_cache()
+        get_encoding(declared, host='example.com')
+        self.assertEqual(('cp1251', 'host'), detect_encoding(undeclared, host='example.com'))
+        self.assertEqual(('utf-8', 'default'), detect_encoding(undeclared, host='example.org'))
+        # A single byte encoding never overrides the detector.
+        set_detector(lambda sample: 'latin-1')
+        self.assertEqual(('latin-1', 'detector'), detect_encoding(undeclared, host='example.com'))
+
+    def test_host_cache_utf8(self):
+        set_host_cache()
+        set_detector(lambda sample: 'latin-1')
+        get_encoding('<meta charset="utf-8"><p>привет</p>'.encode('utf-8'), host='example.com')
+        self.assertEqual(('utf-8', 'host'), detect_encoding('<p>привет, мир</p>'.encode('utf-8'), host='example.com'))
+        # Pages which do not decode with it go to the detector.
+        self.assertEqual(('latin-1', 'detector'), detect_encoding('<p>café au lait</p>'.encode('latin-1'), host='example.com'))
+
+    def test_host_cache_keeps_detected_pages(self):
+        set_host_cache()
+        with open(os.path.join(CORPUS, 'forum-latin1.html'), 'rb') as f:
+            latin1 = f.read()
+        with open(os.path.join(CORPUS, 'blog-cp1251.html'), 'rb') as f:
+            cp1251 = f.read()
+        alone = detect_encoding(latin1)
+        self.assertEqual('declared', detect_encoding(cp1251, host='example.com')[1])
+        self.assertEqual(alone, detect_encoding(latin1, host='example.com'))
@@ -0,0 +1,76 @@
+import json
+import unittest
+
+from lxml.etree import tounicode
+from lxml.html import fragment_fromstring
+
+from readability import Document
+from readability.formats import article_blocks
+from readability.formats import to_markdown
+from readability.formats import to_text
+from .test_article_only import load_sample
+
+ARTICLE = fragment_fromstring(
+    '<div><h2>A  title</h2>'
+    '<p>First <b>bold</b> and <a href="http://x.org/a">a link</a>,<br>then a new line.</p>'
+    'Loose text <i>here</i>'
+    '<ul><li>one</li><li>two *stars*</li></ul>'
+    '<blockquote>Quoted</blockquote>'
+    '<pre>code\n  block</pre>'
+    '<img src="http://x.org/i.png" alt="pic">'
+    '<table><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>2</td></tr></table></div>')
+
+
+class TestFormats(unittest.TestCase):
+
+    def test_blocks(self):
+        self.assertEqual([
+            {'type': 'heading', 'level': 2, 'text': 'A title'},
+            {'type': 'paragraph', 'text': 'First bold and a link,\nthen a new line.'},
+            {'type': 'paragraph', 'text': 'Loose text here'},
+            {'type': 'list', 'ordered': False, 'items': ['one', 'two *stars*']},
+            {'type': 'quote', 'text': 'Quoted'},
+            {'type': 'code', 'text': 'code\n  block'},
+            {'type': 'image', 'src': 'http://x.org/i.png', 'alt': 'pic'},
+            {'type': 'table', 'rows': [['a', 'b'], ['1', '2']]},
+        ], article_blocks(ARTICLE))
+
+    def test_text(self):
+        self.assertEqual(
+            'A title\n\nFirst bold and a link,\nthen a new line.\n\nLoose text here\n\n'
+            'one\ntwo *stars*\n\nQuoted\n\ncode\n  block\n\na\tb\n1\t2',
+            to_text(ARTICLE))
+
+    def test_markdown(self):
+        self.assertEqual(
+            '## A title\n\n'
+            'First **bold** and [a link](http://x.org/a),\\\nthen a new line.\n\n'
+            'Loose text *here*\n\n'
+            '- one\n- two \\*stars\\*\n\n'
+            '> Quoted\n\n'
+            '```\ncode\n  block\n```\n\n'
+            '![pic](http://x.org/i.png)\n\n'
+            '| a | b |\n| --- | --- |\n| 1 | 2 |',
+            to_markdown(ARTICLE))
+
+    def test_parse_formats(self):
+        sample = load_sample('si-game.sample.html')
+        doc = Document(sample)
+        doc.parse(["summary"])
+        html = doc.summary()
+
+        for output_format in ["element", "text", "markdown", "blocks"]:
+            doc = Document(sample)
+            doc.parse(["summary"], output_format=output_format)
+            if output_format == "element":
+                self.assertEqual(html, tounicode(doc.summary()))
+            elif output_format == "blocks":
+                self.assertEqual({'type': 'heading', 'level': 1, 'text': 'Tigers-Royals Preview'},
+                                 json.loads(json.dumps(doc.summary()))[0])
+            elif output_format == "text":
+                self.assertTrue(doc.summary().startswith("Tigers-Royals Preview\n\nJustin Verlander has"))
+            else:
+                self.assertTrue(doc.summary().startswith("# Tigers-Royals Preview\n\n[Justin Verlander]("))
+
+        with self.assertRaises(ValueError):
+            Document(sample).parse(["summary"], output_format="pdf")
@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+
+import lxml.html
+
+from readability.htmls import build_doc
+from readability.htmls import get_image_in_bad_site
+from readability.htmls import get_parser
+from readability.htmls import parse_buffer
+from readability.htmls import parse_page
+from readability.htmls import shorten_title
+
+
+class TestBuildDoc(unittest.TestCase):
+
+    def test_native_encoding(self):
+        page = u'<html><head><meta charset="cp1251"></head><body><p>привет</p></body></html>'
+        doc, enc = build_doc(page.encode('cp1251'))
+        self.assertEqual('cp1251', enc)
+        self.assertEqual(u'привет', doc.find('.//p').text)
+
+    def test_invalid_bytes_fall_back_to_transcoding(self):
+        # Only the start of the page is validated during detection
+        page = u'<meta charset="utf-8"><p>привет</p>'.encode('utf-8')
+        page += b'<div>' + b' ' * 100000 + b'</div><p>\xff\xfe</p>'
+        doc, enc = build_doc(page)
+        self.assertEqual('utf-8', enc)
+        self.assertEqual([u'привет', u'\ufffd\ufffd'], [p.text for p in doc.iter('p')])
+
+    def test_parser_cache(self):
+        self.assertIs(get_parser('koi8-r'), get_parser('koi8-r'))
+        self.assertIsNotNone(get_parser('latin-1'))
+        self.assertIsNone(get_parser('mac-cyrillic'))
+        self.assertIsNone(get_parser('x-no-such-encoding'))
+
+    def test_unknown_encoding(self):
+        doc = parse_page(u'<p>привет</p>'.encode('utf-8'), 'x-no-such-encoding')
+        self.assertEqual(u'привет', doc.find('.//p').text)
+
+    def test_buffer_fed_to_lxml_without_buffer_support(self):
+        page = bytearray(b'<html><body>' + b'<p>text</p>' * 10000 + b'</body></html>')
+        fromstring = lxml.html.document_fromstring
+
+        def bytes_only(html, **kw):
+            if not isinstance(html, bytes):
+                raise ValueError("can only parse strings")
+            return fromstring(html, **kw)
+
+        with mock.patch('lxml.html.document_fromstring', bytes_only):
+            doc = parse_buffer(page, get_parser('utf-8'))
+        self.assertEqual(10000, len(doc.findall('.//p')))
+
+
+class TestSelectors(unittest.TestCase):
+
+    def test_image_in_bad_site(self):
+        doc = lxml.html.document_fromstring(
+            '<div class="comments"><div id="content"><img src="/c.png"></div></div>'
+            '<div class="contents"><img src="/no.png"></div>'
+            '<div class="x\twrapper"><img src="/w.png"></div>'
+            '<div class="content"><img src="/avatar.png"></div>')
+        self.assertEqual('/w.png', get_image_in_bad_site(doc))
+
+    def test_shorten_title_candidates(self):
+        doc = lxml.html.document_fromstring(
+            '<title>Storm hits the coast on Monday, says weather office - Example News</title>'
+            '<div class="news_titles">says weather office - Example News</div>'
+            '<div class="top news_title">Storm hits the coast on Monday</div>')
+        self.assertEqual('Storm hits the coast on Monday', shorten_title(doc))
@@ -0,0 +1,37 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from readability.__main__ import build_parser
+from readability.__main__ import run
+from .test_article_only import load_sample
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def run_cli(self, argv, stdin=b''):
+        stdout = io.StringIO()
+        run(build_parser().parse_args(argv), io.BytesIO(stdin), stdout)
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_jsonl_stdin(self):
+        sample = load_sample('si-game.sample.html')
+        lines = [
+            json.dumps({"url": "http://example.com/a", "html": sample}),
+            "not json",
+            json.dumps({"url": "http://example.com/b", "html": ""}),
+        ]
+        results = self.run_cli(['-f', 'title,short_title'], "\n".join(lines).encode('utf-8'))
+        self.assertEqual(["http://example.com/a", "http://example.com/b"], [r["url"] for r in results])
+        self.assertEqual("Detroit Tigers vs. Kansas City Royals", results[0]["short_title"])
+        self.assertIn("error", results[1])
+
+    def test_directory(self):
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, 'page.html'), 'w') as f:
+                f.write(load_sample('si-game.sample.html'))
+            results = self.run_cli(['-f', 'summary', '--partial', path])
+        self.assertEqual([os.path.join(path, 'page.html')], [r["path"] for r in results])
+        self.assertTrue(results[0]["summary"].startswith("<div><h1>Tigers-Roya"))
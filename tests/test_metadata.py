@@ -0,0 +1,59 @@
+import unittest
+
+from lxml.html import document_fromstring
+
+from readability import Document
+from readability.metadata import read_metadata
+
+
+PAGE = """<html lang="en"><head>
+<title>Storm  hits the coast | Example News</title>
+<meta property="og:title" content="Storm hits the coast">
+<meta property="og:image" content="/storm.jpg">
+<meta property="og:image" content="/other.jpg">
+<meta name="twitter:card" content="summary_large_image">
+<meta name="Description" content="A storm hit the coast on Monday.">
+<link rel="stylesheet" href="/site.css"><link rel="Canonical" href="http://example.com/storm">
+<script type="application/ld+json">
+{"@context": "https://schema.org", "@graph": [
+  {"@type": "WebSite", "name": "Example News"},
+  {"@type": "NewsArticle", "headline": "Storm hits the coast", "datePublished": "2026-03-02T08:00:00Z",
+   "author": [{"@type": "Person", "name": "Jane Doe"}], "publisher": {"name": "Example News"}}]}
+</script>
+<script type="application/ld+json">{not json</script>
+</head><body><p>The storm hit the coast on Monday, and many people, even inland, lost power.</p></body></html>"""
+
+
+class TestMetadata(unittest.TestCase):
+
+    def test_fields(self):
+        metadata = read_metadata(document_fromstring(PAGE))
+        self.assertEqual('Storm hits the coast | Example News', metadata['title'])
+        self.assertEqual('Storm hits the coast', metadata['headline'])
+        self.assertEqual('A storm hit the coast on Monday.', metadata['description'])
+        self.assertEqual('/storm.jpg', metadata['image'])
+        self.assertEqual('http://example.com/storm', metadata['canonical'])
+        self.assertEqual('en', metadata['lang'])
+        self.assertEqual('Example News', metadata['site_name'])
+        self.assertEqual('Jane Doe', metadata['author'])
+        self.assertEqual('2026-03-02T08:00:00Z', metadata['published_time'])
+        self.assertIsNone(metadata['modified_time'])
+        self.assertEqual('summary_large_image', metadata['twitter']['twitter:card'])
+        self.assertEqual(['NewsArticle', 'WebSite'], [obj['@type'] for obj in metadata['json_ld']])
+
+    def test_title_outside_the_head(self):
+        metadata = read_metadata(document_fromstring(
+            '<html><head><meta charset="utf-8"></head><body><title>Late</title></body></html>'))
+        self.assertEqual('Late', metadata['title'])
+        self.assertIsNone(read_metadata(document_fromstring('<p>no title</p>'))['title'])
+
+    def test_document_field(self):
+        doc = Document(PAGE)
+        doc.parse(["title", "main_image_url", "metadata"])
+        self.assertEqual(doc.title(), doc.metadata()['title'])
+        self.assertEqual('/storm.jpg', doc.main_image_url())
+        self.assertEqual('2026-03-02T08:00:00Z', doc.metadata()['published_time'])
+
+        doc = Document(PAGE)
+        doc.parse(["title"])
+        self.assertEqual('Jane Doe', doc.metadata()['author'])
@@ -0,0 +1,50 @@
+import unittest
+
+from lxml.html import fragment_fromstring
+
+from readability.metrics import COUNTED_TAGS
+from readability.metrics import TextMetrics
+from readability.readability import clean
+
+HTML = (u'<div> Some,  text <a href="#">a link</a>\n\t'
+        u'<p>para, <a href="#"> other  </a> , <span> \t </span>tail </p>  end, </div>')
+
+
+def text_length(elem):
+    """What the scoring measured before TextMetrics"""
+    return len(clean(elem.text_content() or ""))
+
+
+class TestTextMetrics(unittest.TestCase):
+
+    def test_matches_text_length(self):
+        root = fragment_fromstring(HTML)
+        metrics = TextMetrics(root)
+        for elem in root.iter():
+            links = sum(text_length(a) for a in elem.findall('.//a'))
+            self.assertEqual(text_length(elem), metrics.text_length(elem))
+            self.assertEqual(links, metrics.link_length(elem))
+            self.assertEqual(elem.text_content().count(','), metrics.comma_count(elem))
+
+    def test_invalidate_after_drop(self):
+        root = fragment_fromstring(HTML)
+        metrics = TextMetrics(root)
+        link = root.find('.//p/a')
+        metrics.invalidate(link.getparent())
+        link.drop_tree()
+        self.assertEqual(text_length(root), metrics.text_length(root))
+        self.assertEqual(text_length(root.find('a')), metrics.link_length(root))
+
+    def test_tag_counts(self):
+        root = fragment_fromstring(
+            u'<div><ul><li><a href="#">x</a></li><li><img src="a.png"></li></ul>'
+            u'<p>a <a href="#">b</a><!-- c --></p><form><input></form></div>')
+        metrics = TextMetrics(root)
+        for elem in root.iter():
+            expected = dict((tag, len(elem.findall('.//' + tag))) for tag in COUNTED_TAGS)
+            self.assertEqual(expected, metrics.tag_counts(elem))
+        paragraph = root.find('p')
+        metrics.invalidate(root)
+        paragraph.drop_tree()
+        counts = metrics.tag_counts(root)
+        self.assertEqual((0, 1), (counts['p'], counts['a']))
@@ -0,0 +1,143 @@
+import asyncio
+import gzip
+import threading
+import time
+import unittest
+import zlib
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from readability.pipeline import Fetcher
+from readability.pipeline import extract_urls
+from .test_article_only import load_sample
+
+
+SAMPLE = load_sample('si-game.sample.html').encode('utf-8')
+
+
+class SampleHandler(BaseHTTPRequestHandler):
+    """Serves the sample page plainly, compressed or chunked"""
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    # Requests to /slow being served, and the most seen at once.
+    lock = threading.Lock()
+    in_flight = 0
+    most_in_flight = 0
+
+    def setup(self):
+        SampleHandler.connections += 1
+        BaseHTTPRequestHandler.setup(self)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/slow'):
+            with SampleHandler.lock:
+                SampleHandler.in_flight += 1
+                SampleHandler.most_in_flight = max(SampleHandler.most_in_flight, SampleHandler.in_flight)
+            time.sleep(0.1)
+            with SampleHandler.lock:
+                SampleHandler.in_flight -= 1
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/plain')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path == '/missing':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body, encoding = SAMPLE, None
+        if self.path in ('/gzip', '/chunked'):
+            body, encoding = gzip.compress(SAMPLE), 'gzip'
+        elif self.path == '/deflate':
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            body, encoding = compressor.compress(SAMPLE) + compressor.flush(), 'deflate'
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if self.path == '/chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(body), 1000):
+                chunk = body[i:i + 1000]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+class TestPipeline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), SampleHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def run_pipeline(self, paths, **options):
+        async def collect():
+            results = {}
+            async for url, result in extract_urls([self.base + p for p in paths], **options):
+                results[url[len(self.base):]] = result
+            return results
+        return asyncio.run(collect())
+
+    def test_extract(self):
+        paths = ['/plain', '/gzip', '/deflate', '/chunked', '/redirect', '/missing']
+        results = self.run_pipeline(paths, fields=['title', 'summary'], queue_size=1, extractors=2)
+        self.assertEqual(set(paths), set(results))
+        for path in paths[:-1]:
+            self.assertIsNone(results[path].error, path)
+            self.assertTrue(results[path].fields['summary'].startswith('<html><body><h1>Tigers-Roya'))
+        self.assertEqual(self.base + '/plain', results['/redirect'].response.url)
+        self.assertEqual('FetchError: HTTP status 404', results['/missing'].error)
+
+    def test_connection_reuse(self):
+        async def fetch_all():
+            fetcher = Fetcher(concurrency=4, per_host=1)
+            try:
+                responses = await asyncio.gather(*[fetcher.fetch(self.base + '/gzip') for _ in range(5)])
+            finally:
+                await fetcher.close()
+            return fetcher, responses
+
+        fetcher, responses = asyncio.run(fetch_all())
+        self.assertEqual([SAMPLE] * 5, [r.body for r in responses])
+        self.assertEqual(1, fetcher.connections_opened)
+        self.assertEqual(0, fetcher.active_hosts())
+
+    def test_busy_host_does_not_hold_back_others(self):
+        # Two host names for the same server: with the urls grouped by host,
+        # the second host is fetched while the first one is at its limit.
+        other = self.base.replace('127.0.0.1', 'localhost')
+        urls = [self.base + '/slow/%d' % i for i in range(6)] + [other + '/slow/%d' % i for i in range(2)]
+
+        async def run():
+            return [url async for url, _ in extract_urls(urls, concurrency=3, per_host=2)]
+
+        SampleHandler.most_in_flight = 0
+        done = asyncio.run(run())
+        self.assertEqual(sorted(urls), sorted(done))
+        self.assertEqual(3, SampleHandler.most_in_flight)
+        # The first host needs three rounds, the other one is done with
+        # the first two.
+        self.assertTrue(all(url.startswith(self.base) for url in done[6:]))
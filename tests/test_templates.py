@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from readability import Document
+from readability.templates import TemplateStore
+from readability.templates import element_signature
+from readability.templates import find_signature
+from lxml.html import document_fromstring
+
+
+def page(n, layout="main"):
+    paragraphs = "".join(
+        "<p>Paragraph %d of story %d, with a few commas, words, and enough text to count.</p>" % (i, n)
+        for i in range(8))
+    return (
+        '<html><body><div id="nav"><a href="/a">Home</a> <a href="/b">News</a></div>'
+        '<div class="wrap"><div class="%s"><h1>Story %d</h1>%s</div>'
+        '<div class="sidebar"><p>Related stories you might like, and more.</p></div></div>'
+        '</body></html>' % (layout, n, paragraphs))
+
+
+class TestTemplates(unittest.TestCase):
+
+    def extract(self, html, templates=None):
+        doc = Document(html, base_url="http://news.example.com/story", templates=templates, stats=True)
+        doc.parse(["summary"])
+        return doc.summary(), doc.stats().template
+
+    def test_signature(self):
+        doc = document_fromstring(page(1))
+        elem = doc.find(".//div[@class='main']")
+        self.assertIs(elem, find_signature(doc, element_signature(elem)))
+        self.assertIsNone(find_signature(doc, element_signature(doc.find(".//p"))))
+
+    def test_learned_container(self):
+        templates = TemplateStore(min_pages=2)
+        for n in range(2):
+            self.assertEqual((self.extract(page(n))[0], None), self.extract(page(n), templates))
+        self.assertEqual(2, templates.confidence("news.example.com"))
+
+        for n in range(2, 5):
+            summary, template = self.extract(page(n), templates)
+            self.assertEqual("used", template)
+            self.assertEqual(self.extract(page(n))[0], summary)
+        self.assertEqual(3, templates.hits)
+
+        # A new layout: scored in full, and learned again.
+        summary, template = self.extract(page(5, "story"), templates)
+        self.assertEqual("failed", template)
+        self.assertEqual(self.extract(page(5, "story"))[0], summary)
+        self.assertEqual(1, templates.misses)
+        self.assertEqual(1, templates.confidence("news.example.com"))
+
+    def test_decay(self):
+        templates = TemplateStore(min_pages=2, half_life=0.05)
+        for n in range(3):
+            self.extract(page(n), templates)
+        self.assertEqual("used", self.extract(page(3), templates)[1])
+        time.sleep(0.1)
+        self.assertIsNone(self.extract(page(4), templates)[1])
+
+    def test_save_load(self):
+        templates = TemplateStore(min_pages=1)
+        self.extract(page(1), templates)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "templates.json")
+            templates.save(path)
+            loaded = TemplateStore(min_pages=1)
+            loaded.load(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual("used", self.extract(page(2), loaded)[1])